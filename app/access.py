@@ -0,0 +1,158 @@
+import threading
+from dataclasses import dataclass
+from fastapi import Depends, HTTPException, Path
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+from .auth import Principal, get_current_user
+from .cache import TTLCache
+from .database import get_async_db, get_db, get_engine
+from .replica import get_async_read_db, get_read_db
+
+# Права на проекты: для пользователя - карта project_id -> роль (owner/member),
+# собранная одним запросом по индексам projects(owner_id) и project_members(user_id)
+# и закэшированная. Проект колонки или задачи - одним запросом по первичным
+# ключам, без кэша events.column_project_id: архив удаляет колонки из другого
+# процесса, и устаревшая запись там не должна решать, кому открыт объект.
+#
+# Карту сбрасывают create_project, add_user_to_project, remove_user_from_project
+# (и их варианты в пакете и импорте) после commit. Сброс действует в своем
+# воркере; в остальных карта устаревает не дольше ACCESS_CACHE_TTL.
+# Карта включает и неактивные проекты: активность проверяют сами обработчики.
+
+OWNER = "owner"
+MEMBER = "member"
+ACCESS_CACHE_SIZE = 10000
+ACCESS_CACHE_TTL = 60
+
+
+@dataclass(frozen=True)
+class ProjectRole:
+    """Проект объекта из пути и роль в нем текущего пользователя."""
+    project_id: int
+    role: str
+
+
+def load_roles(conn, user_id: int) -> dict[int, str]:
+    """project_id -> роль пользователя; владелец важнее участия."""
+    owned = select(models.Project.id, literal(OWNER)).where(models.Project.owner_id == user_id)
+    joined = select(models.ProjectMember.project_id, literal(MEMBER)).where(models.ProjectMember.user_id == user_id)
+    roles = {}
+    for project_id, role in conn.execute(owned.union_all(joined)):
+        if roles.get(project_id) != OWNER:
+            roles[project_id] = role
+    return roles
+
+
+class ProjectAccessIndex:
+    """Кэш карт ролей по пользователям."""
+
+    def __init__(self, maxsize: int = ACCESS_CACHE_SIZE, ttl: float = ACCESS_CACHE_TTL):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def roles(self, user_id: int) -> dict[int, str]:
+        roles = self.cache.get(user_id)
+        if roles is None:
+            roles = self._load(user_id)
+        return roles
+
+    async def roles_async(self, user_id: int) -> dict[int, str]:
+        """roles() для async def: на промахе кэша карта читается в пуле потоков."""
+        roles = self.cache.get(user_id)
+        if roles is None:
+            roles = await run_in_threadpool(self._load, user_id)
+        return roles
+
+    def _load(self, user_id: int) -> dict[int, str]:
+        generation = self._generation
+        # Всегда с основной базы: реплика может не знать о только что добавленном участнике
+        with get_engine().connect() as conn:
+            roles = load_roles(conn, user_id)
+        with self._lock:
+            # Сброс во время запроса: карта могла быть прочитана до commit изменения
+            if generation == self._generation:
+                self.cache.set(user_id, roles)
+        return roles
+
+    def invalidate(self, *user_ids: int):
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self.cache.invalidate(user_id)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+project_access = ProjectAccessIndex()
+
+
+def _column_project_id(db: Session, column_id: int):
+    return db.execute(select(models.Column.project_id).where(models.Column.id == column_id)).scalar()
+
+def _task_project_id(db: Session, task_id: int):
+    return db.execute(
+        select(models.Column.project_id).join(models.Task, models.Task.column_id == models.Column.id)
+        .where(models.Task.id == task_id)
+    ).scalar()
+
+_RESOLVERS = {
+    "project": (lambda db, project_id: project_id, "Проект не найден"),
+    "column": (_column_project_id, "Колонка не найдена"),
+    "task": (_task_project_id, "Задача не найдена"),
+}
+
+def _project_role(roles: dict, project_id, role: str, not_found: str) -> ProjectRole:
+    if project_id not in roles:
+        raise HTTPException(status_code=404, detail=not_found)
+    if role == OWNER and roles[project_id] != OWNER:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return ProjectRole(project_id, roles[project_id])
+
+def require_access(kind: str, role: str = MEMBER, replica: bool = False):
+    """Зависимость FastAPI: проверяет роль пользователя в проекте объекта {kind}_id из пути.
+
+    Чужой или несуществующий объект - 404, недостаточная роль - 403. Сессия та
+    же, что у обработчика: get_read_db при replica=True, иначе get_db.
+    """
+    resolve, not_found = _RESOLVERS[kind]
+
+    def dependency(
+        object_id: int = Path(alias=f"{kind}_id"),
+        db: Session = Depends(get_read_db if replica else get_db),
+        current_user: Principal = Depends(get_current_user),
+    ) -> ProjectRole:
+        # Карта ролей - до запроса в сессии: на промахе кэша не держим два соединения
+        roles = project_access.roles(current_user.id)
+        return _project_role(roles, resolve(db, object_id), role, not_found)
+
+    return dependency
+
+def require_access_async(kind: str, role: str = MEMBER, replica: bool = False):
+    """require_access для async def обработчиков: сессия get_async_read_db или get_async_db, без пула потоков."""
+    resolve, not_found = _RESOLVERS[kind]
+
+    async def dependency(
+        object_id: int = Path(alias=f"{kind}_id"),
+        db: AsyncSession = Depends(get_async_read_db if replica else get_async_db),
+        current_user: Principal = Depends(get_current_user),
+    ) -> ProjectRole:
+        roles = await project_access.roles_async(current_user.id)
+        return _project_role(roles, await db.run_sync(resolve, object_id), role, not_found)
+
+    return dependency
+
+
+project_member = require_access("project")
+project_owner = require_access("project", OWNER)
+column_member = require_access("column")
+column_owner = require_access("column", OWNER)
+task_member = require_access("task")
+task_member_replica = require_access("task", replica=True)
+project_member_async = require_access_async("project")
+column_member_replica_async = require_access_async("column", replica=True)
+task_member_replica_async = require_access_async("task", replica=True)
@@ -0,0 +1,186 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from starlette.responses import JSONResponse
+from . import config, metrics
+from .auth import decode_token
+
+# Допуск запросов до обработчиков: лишняя нагрузка отклоняется сразу, а не
+# ждет в очереди к пулу БД, где задерживала бы и остальных пользователей.
+#   - token bucket на ключ: subject JWT (тот же разбор токена, что в
+#     get_current_user), для /token и анонимных запросов - IP клиента
+#     (за прокси - из X-Forwarded-For, см. FORWARDED_PROXIES);
+#   - предел одновременных запросов одного ключа - 429; потоковый ответ
+#     перестает занимать место ключа, как только начат;
+#   - общий предел одновременных запросов по размеру пула БД - 503.
+# Ответ содержит Retry-After; служебные /metrics и /internal/* не ограничиваются.
+
+ADMISSION_MAX_KEYS = 10000
+LOGIN_PATH = "/token"
+EXEMPT_PREFIXES = ("/metrics", "/internal/")
+RATE_LIMITED_DETAIL = "Слишком много запросов, повторите попытку позже"
+OVERLOADED_DETAIL = "Сервер перегружен, повторите попытку позже"
+
+
+class RateLimiter:
+    """Token bucket на ключ: rate токенов в секунду, не больше burst; ключи - LRU."""
+
+    def __init__(self, rate: float, burst: int, maxsize: int = ADMISSION_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """0, если запрос допущен, иначе сколько секунд ждать следующего токена."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionControl:
+    """Лимиты и счетчики допуска; настройки берутся из config при создании и в reset()."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.users = RateLimiter(config.ADMISSION_RATE, config.ADMISSION_BURST)
+            self.logins = RateLimiter(config.LOGIN_RATE, config.LOGIN_BURST)
+            self.max_in_flight = config.ADMISSION_MAX_IN_FLIGHT
+            self.max_in_flight_per_key = config.ADMISSION_MAX_IN_FLIGHT_PER_KEY
+            self.in_flight = 0
+            self.in_flight_by_key = {}
+            self.admitted = 0
+            self.rejected = {"rate_limited": 0, "key_concurrency": 0, "overloaded": 0}
+
+    def admit(self, key: str, limiter: RateLimiter):
+        """(reason, retry_after) при отказе или None; допущенный запрос обязан вызвать release_key и release."""
+        wait = limiter.acquire(key)
+        with self._lock:
+            if wait:
+                reason, retry_after = "rate_limited", math.ceil(wait)
+            elif self.in_flight_by_key.get(key, 0) >= self.max_in_flight_per_key:
+                reason, retry_after = "key_concurrency", 1
+            elif self.in_flight >= self.max_in_flight:
+                reason, retry_after = "overloaded", 1
+            else:
+                self.in_flight += 1
+                self.in_flight_by_key[key] = self.in_flight_by_key.get(key, 0) + 1
+                self.admitted += 1
+                return None
+            self.rejected[reason] += 1
+        metrics.admission_rejected_total.inc((reason,))
+        return reason, retry_after
+
+    def release_key(self, key: str):
+        with self._lock:
+            count = self.in_flight_by_key.pop(key) - 1
+            if count:
+                self.in_flight_by_key[key] = count
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": config.ADMISSION_ENABLED,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "max_in_flight_per_key": self.max_in_flight_per_key,
+                "keys": len(self.users) + len(self.logins),
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+            }
+
+
+admission_control = AdmissionControl()
+
+
+def client_address(scope) -> str:
+    """IP клиента; за FORWARDED_PROXIES прокси - адрес, который записал ближайший из них."""
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if config.FORWARDED_PROXIES:
+        # Левые элементы присылает сам клиент, доверять можно только дописанным прокси
+        forwarded = [
+            item.strip() for name, value in scope["headers"] if name == b"x-forwarded-for"
+            for item in value.decode("latin-1").split(",") if item.strip()
+        ]
+        if forwarded:
+            address = forwarded[max(0, len(forwarded) - config.FORWARDED_PROXIES)]
+    return address
+
+def _client_key(scope) -> str:
+    return f"ip:{client_address(scope)}"
+
+def admission_key(scope):
+    """Ключ лимита и его token bucket: пользователь из JWT или IP клиента."""
+    if scope["path"] == LOGIN_PATH:
+        return _client_key(scope), admission_control.logins
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            payload = decode_token(token) if scheme.lower() == "bearer" else None
+            if payload and payload.get("sub"):
+                return f"user:{payload['sub']}", admission_control.users
+            break
+    return _client_key(scope), admission_control.users
+
+
+class AdmissionMiddleware:
+    """ASGI middleware: отклоняет запрос сверх лимитов до входа в приложение."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.ADMISSION_ENABLED or scope["path"].startswith(EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+        key, limiter = admission_key(scope)
+        rejected = admission_control.admit(key, limiter)
+        if rejected is not None:
+            reason, retry_after = rejected
+            overloaded = reason == "overloaded"
+            response = JSONResponse(
+                {"detail": OVERLOADED_DETAIL if overloaded else RATE_LIMITED_DETAIL},
+                status_code=503 if overloaded else 429,
+                headers={"Retry-After": str(retry_after)},
+            )
+            return await response(scope, receive, send)
+        key_released = False
+
+        async def send_started(message):
+            nonlocal key_released
+            # Ответ начат: обработчик свой ключ больше не держит, даже если
+            # тело (выгрузка проекта) будет передаваться еще долго
+            if message["type"] == "http.response.start" and not key_released:
+                key_released = True
+                admission_control.release_key(key)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_started)
+        finally:
+            if not key_released:
+                admission_control.release_key(key)
+            admission_control.release()
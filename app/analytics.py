@@ -0,0 +1,277 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import delete, event, exists, func, insert, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from . import models
+from .database import insert_or_update
+from .events import column_project_id
+from .pagination import keyset_filter
+
+# Аналитика потока по проекту: cumulative flow diagram и lead/cycle time.
+# Каждый переход задачи (создание, перемещение, удаление, восстановление)
+# записывается в task_transitions в той же транзакции, и тут же обновляются
+# дневные агрегаты column_daily_flow и project_daily_lead_time. Эндпоинты читают
+# только агрегаты, поэтому их время не зависит от объема истории.
+#
+# "Готово" - последняя по порядку активная колонка проекта. Lead time - от
+# создания задачи до попадания в нее, cycle time - от первого перемещения.
+# Каскадное удаление колонок и проектов (UPDATE в обход ORM) переходов не пишет:
+# удаленная колонка просто не показывается в CFD, а после восстановления ее
+# задачи на месте.
+
+Task, Column = models.Task, models.Column
+Transition, Flow, LeadTime = models.TaskTransition, models.ColumnDailyFlow, models.ProjectDailyLeadTime
+
+
+def _task_transitions(task: models.Task, is_new: bool) -> list:
+    """Переходы (kind, из колонки, в колонку) задачи в текущем flush."""
+    if is_new:
+        return [("created", None, task.column_id)] if task.is_active else []
+    attrs = inspect(task).attrs
+    column = attrs.column_id.history
+    old_column_id = column.deleted[0] if column.deleted else task.column_id
+    if attrs.is_active.history.has_changes():
+        if task.is_active:
+            return [("restored", None, task.column_id)]
+        return [("deleted", old_column_id, None)]
+    if column.has_changes() and task.is_active and old_column_id != task.column_id:
+        return [("moved", old_column_id, task.column_id)]
+    return []
+
+@event.listens_for(Session, "after_flush")
+def _record_task_transitions(session: Session, flush_context):
+    now = models.utcnow()
+    transitions = []
+    for task, is_new in [(o, True) for o in session.new] + [(o, False) for o in session.dirty]:
+        if not isinstance(task, models.Task):
+            continue
+        for kind, from_column_id, to_column_id in _task_transitions(task, is_new):
+            transitions.append(({
+                "task_id": task.id,
+                "project_id": column_project_id(session, to_column_id or from_column_id),
+                "kind": kind,
+                "from_column_id": from_column_id,
+                "to_column_id": to_column_id,
+                "occurred_at": now,
+            }, task.created_at))
+    if transitions:
+        record_transitions(session.connection(), transitions)
+
+
+def done_column_id(conn: Connection, project_id: int):
+    return conn.execute(
+        select(Column.id).where(Column.project_id == project_id, Column.is_active == True)
+        .order_by(Column.order.desc(), Column.id.desc()).limit(1)
+    ).scalar()
+
+def record_transitions(conn: Connection, transitions: list):
+    """Пишет события и обновляет агрегаты; transitions - пары (строка task_transitions, created_at задачи)."""
+    conn.execute(insert(Transition), [row for row, _ in transitions])
+    flow = defaultdict(lambda: [0, 0])
+    done_columns = {}
+    for row, created_at in transitions:
+        day = row["occurred_at"].date()
+        if row["to_column_id"] is not None:
+            flow[(row["project_id"], row["to_column_id"], day)][0] += 1
+        if row["from_column_id"] is not None:
+            flow[(row["project_id"], row["from_column_id"], day)][1] += 1
+        if row["kind"] not in ("created", "moved"):
+            continue
+        if row["project_id"] not in done_columns:
+            done_columns[row["project_id"]] = done_column_id(conn, row["project_id"])
+        if row["to_column_id"] != done_columns[row["project_id"]]:
+            continue
+        lead = _seconds(created_at, row["occurred_at"])
+        cycle = None
+        if row["kind"] == "moved":
+            started_at = conn.execute(
+                select(func.min(Transition.occurred_at)).where(
+                    Transition.task_id == row["task_id"], Transition.kind == "moved"
+                )
+            ).scalar()
+            cycle = _seconds(started_at, row["occurred_at"])
+        _bump_lead_time(conn, row["project_id"], day, lead, cycle)
+    for (project_id, column_id, day), (arrivals, departures) in sorted(flow.items()):
+        _bump_flow(conn, project_id, column_id, day, arrivals, departures)
+
+def _seconds(started_at, finished_at) -> int:
+    return max(0, int((finished_at - started_at).total_seconds())) if started_at else 0
+
+def _bump_flow(conn: Connection, project_id: int, column_id: int, day: date, arrivals: int, departures: int):
+    key = (Flow.project_id == project_id, Flow.column_id == column_id, Flow.day == day)
+    bump = update(Flow).where(*key).values(
+        arrivals=Flow.arrivals + arrivals,
+        departures=Flow.departures + departures,
+        wip=Flow.wip + (arrivals - departures),
+    )
+    if conn.execute(bump).rowcount:
+        return
+    # Первое событие колонки за день: число задач переносится с последнего дня с событиями
+    previous = conn.execute(
+        select(Flow.wip).where(Flow.project_id == project_id, Flow.column_id == column_id, Flow.day < day)
+        .order_by(Flow.day.desc()).limit(1)
+    ).scalar() or 0
+    insert_or_update(conn, insert(Flow).values(
+        project_id=project_id, column_id=column_id, day=day,
+        arrivals=arrivals, departures=departures, wip=previous + arrivals - departures,
+    ), bump)
+
+def _bump_lead_time(conn: Connection, project_id: int, day: date, lead: int, cycle: int = None):
+    values = {"completed": 1, "lead_seconds": lead, "cycle_completed": int(cycle is not None), "cycle_seconds": cycle or 0}
+    bump = update(LeadTime).where(LeadTime.project_id == project_id, LeadTime.day == day).values(
+        {getattr(LeadTime, name): getattr(LeadTime, name) + value for name, value in values.items()}
+    )
+    if not conn.execute(bump).rowcount:
+        insert_or_update(conn, insert(LeadTime).values(project_id=project_id, day=day, **values), bump)
+
+
+# Чтение
+
+def cumulative_flow(db: Session, project_id: int, start: date, end: date) -> dict:
+    """Число задач в каждой активной колонке на конец каждого дня из [start, end]."""
+    # Значение на начало периода - последний день с событиями до start; по колонке - один seek по PK
+    opening = select(Flow.wip).where(
+        Flow.project_id == project_id, Flow.column_id == Column.id, Flow.day < start
+    ).order_by(Flow.day.desc()).limit(1).correlate(Column).scalar_subquery()
+    columns = db.query(Column.id, Column.name, opening.label("opening")).filter(
+        Column.project_id == project_id, Column.is_active == True
+    ).order_by(Column.order, Column.id).all()
+    changes = {
+        (column_id, day): wip for column_id, day, wip in db.query(Flow.column_id, Flow.day, Flow.wip).filter(
+            Flow.project_id == project_id, Flow.day >= start, Flow.day <= end
+        )
+    }
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    series = []
+    for column in columns:
+        wip = column.opening or 0
+        values = []
+        for day in days:
+            wip = changes.get((column.id, day), wip)
+            values.append(wip)
+        series.append({"column_id": column.id, "name": column.name, "values": values})
+    return {"project_id": project_id, "dates": days, "series": series}
+
+def lead_time(db: Session, project_id: int, start: date, end: date) -> dict:
+    """Завершенные задачи и средние lead/cycle time по дням и за период, в часах."""
+    rows = db.query(LeadTime).filter(
+        LeadTime.project_id == project_id, LeadTime.day >= start, LeadTime.day <= end
+    ).order_by(LeadTime.day).all()
+
+    def summary(completed, lead_seconds, cycle_completed, cycle_seconds) -> dict:
+        return {
+            "completed": completed,
+            "avg_lead_hours": round(lead_seconds / completed / 3600, 2) if completed else None,
+            "avg_cycle_hours": round(cycle_seconds / cycle_completed / 3600, 2) if cycle_completed else None,
+        }
+
+    totals = [sum(getattr(r, name) for r in rows) for name in ("completed", "lead_seconds", "cycle_completed", "cycle_seconds")]
+    return {
+        "project_id": project_id,
+        "days": [
+            {"date": r.day, **summary(r.completed, r.lead_seconds, r.cycle_completed, r.cycle_seconds)} for r in rows
+        ],
+        "total": summary(*totals),
+    }
+
+
+# Заполнение для существующих данных
+
+def backfill(engine: Engine, chunk_size: int = 1000) -> dict:
+    """Строит переходы и агрегаты для данных, появившихся до аналитики.
+
+    Задачам без истории добавляются created (в текущую колонку, в момент создания)
+    и, для удаленных по отдельности, deleted; прежние перемещения неизвестны.
+    Затем агрегаты каждого проекта пересчитываются из его переходов, которые
+    читаются порциями по chunk_size; каждый проект - своя транзакция.
+    """
+    synthesized = _synthesize_transitions(engine, chunk_size)
+    with engine.connect() as conn:
+        project_ids = conn.scalars(select(models.Project.id).order_by(models.Project.id)).all()
+    for project_id in project_ids:
+        with engine.begin() as conn:
+            rebuild_project(conn, project_id, chunk_size)
+    return {"transitions": synthesized, "projects": len(project_ids)}
+
+def initial_transitions(task, project_id: int, column_deactivated_at=None) -> list:
+    """Переходы задачи без истории: created в текущую колонку и, если ее удалили отдельно, deleted."""
+    transitions = [{"task_id": task.id, "project_id": project_id, "kind": "created", "from_column_id": None,
+                    "to_column_id": task.column_id, "occurred_at": task.created_at or models.utcnow()}]
+    # Удаленные каскадом (с тем же временем, что и колонка) остаются в скрытой колонке
+    if not task.is_active and task.deactivated_at and task.deactivated_at != column_deactivated_at:
+        transitions.append({"task_id": task.id, "project_id": project_id, "kind": "deleted",
+                            "from_column_id": task.column_id, "to_column_id": None,
+                            "occurred_at": task.deactivated_at})
+    return transitions
+
+def _synthesize_transitions(engine: Engine, chunk_size: int) -> int:
+    synthesized = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Task.id, Task.column_id, Task.created_at, Task.is_active, Task.deactivated_at,
+                       Column.project_id, Column.deactivated_at.label("column_deactivated_at"))
+                .join(Column, Column.id == Task.column_id)
+                .where(Task.id > last_id, ~exists().where(Transition.task_id == Task.id))
+                .order_by(Task.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                return synthesized
+            transitions = [t for row in rows for t in initial_transitions(row, row.project_id, row.column_deactivated_at)]
+            conn.execute(insert(Transition), transitions)
+            synthesized += len(transitions)
+            last_id = rows[-1].id
+
+def rebuild_project(conn: Connection, project_id: int, chunk_size: int = 1000):
+    """Пересчитывает агрегаты проекта из его переходов; транзакция - у вызывающего."""
+    flow = defaultdict(lambda: [0, 0])
+    lead = defaultdict(lambda: [0, 0, 0, 0])
+    started = {}
+    done_id = done_column_id(conn, project_id)
+    keys = [Transition.occurred_at, Transition.id]
+    position = None
+    while True:
+        # created_at задачи - как при живой записи; в памяти только задачи с перемещениями
+        query = select(Transition, Task.created_at.label("task_created_at")).outerjoin(
+            Task, Task.id == Transition.task_id
+        ).where(Transition.project_id == project_id)
+        if position is not None:
+            query = query.where(keyset_filter(keys, position))
+        rows = conn.execute(query.order_by(*keys).limit(chunk_size)).all()
+        if not rows:
+            break
+        position = [rows[-1].occurred_at, rows[-1].id]
+        for row in rows:
+            day = row.occurred_at.date()
+            if row.to_column_id is not None:
+                flow[(row.to_column_id, day)][0] += 1
+            if row.from_column_id is not None:
+                flow[(row.from_column_id, day)][1] += 1
+            if row.kind == "moved":
+                started.setdefault(row.task_id, row.occurred_at)
+            if row.kind in ("created", "moved") and row.to_column_id == done_id:
+                totals = lead[day]
+                totals[0] += 1
+                totals[1] += _seconds(row.task_created_at, row.occurred_at)
+                if row.kind == "moved":
+                    totals[2] += 1
+                    totals[3] += _seconds(started[row.task_id], row.occurred_at)
+
+    flow_rows = []
+    wip = defaultdict(int)
+    for (column_id, day), (arrivals, departures) in sorted(flow.items(), key=lambda item: (item[0][1], item[0][0])):
+        wip[column_id] += arrivals - departures
+        flow_rows.append({"project_id": project_id, "column_id": column_id, "day": day,
+                          "arrivals": arrivals, "departures": departures, "wip": wip[column_id]})
+    lead_rows = [
+        {"project_id": project_id, "day": day, "completed": c, "lead_seconds": l, "cycle_completed": cc, "cycle_seconds": cs}
+        for day, (c, l, cc, cs) in sorted(lead.items())
+    ]
+    conn.execute(delete(Flow).where(Flow.project_id == project_id))
+    conn.execute(delete(LeadTime).where(LeadTime.project_id == project_id))
+    if flow_rows:
+        conn.execute(insert(Flow), flow_rows)
+    if lead_rows:
+        conn.execute(insert(LeadTime), lead_rows)
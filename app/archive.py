@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, exists, insert, literal, select
+from . import events, models
+from .database import get_engine
+
+# Перенос давно неактивных задач и колонок в archived_* таблицы, чтобы горячие
+# tasks и columns (и их индексы) содержали в основном живые строки. Порциями по
+# id, каждая порция - своя короткая транзакция, как purge_task_logs в audit.py.
+# Проекты остаются на месте: их мало, и на них ссылаются участники и версии.
+
+ARCHIVE_AFTER_DAYS = 90
+
+Task, Column, TaskLog = models.Task, models.Column, models.TaskLog
+ARCHIVED_TASK_FIELDS = ["id", "title", "description", "column_id", "author_id", "priority", "rank",
+                        "created_at", "deactivated_at"]
+ARCHIVED_COLUMN_FIELDS = ["id", "name", "order", "project_id", "deactivated_at"]
+ARCHIVED_LOG_FIELDS = ["id", "task_id", "message", "user_id", "created_at"]
+
+
+def _archive_tasks(conn, ids: list, archived_at: datetime):
+    conn.execute(insert(models.ArchivedTask).from_select(
+        ARCHIVED_TASK_FIELDS + ["archived_at"],
+        select(*[Task.__table__.c[name] for name in ARCHIVED_TASK_FIELDS], literal(archived_at)).where(Task.id.in_(ids))
+    ))
+    # Журнал задачи уходит вместе с ней, поисковые термины больше не нужны
+    conn.execute(insert(models.ArchivedTaskLog).from_select(
+        ARCHIVED_LOG_FIELDS,
+        select(*[TaskLog.__table__.c[name] for name in ARCHIVED_LOG_FIELDS]).where(TaskLog.task_id.in_(ids))
+    ))
+    conn.execute(delete(TaskLog).where(TaskLog.task_id.in_(ids)))
+    conn.execute(delete(models.TaskSearchTerm).where(models.TaskSearchTerm.task_id.in_(ids)))
+    conn.execute(delete(Task).where(Task.id.in_(ids)))
+
+def _archive_columns(conn, ids: list, archived_at: datetime):
+    conn.execute(insert(models.ArchivedColumn).from_select(
+        ARCHIVED_COLUMN_FIELDS + ["archived_at"],
+        select(*[Column.__table__.c[name] for name in ARCHIVED_COLUMN_FIELDS], literal(archived_at)).where(
+            Column.id.in_(ids)
+        )
+    ))
+    conn.execute(delete(models.ColumnTaskCounter).where(models.ColumnTaskCounter.column_id.in_(ids)))
+    conn.execute(delete(Column).where(Column.id.in_(ids)))
+    events.forget_columns(ids)
+
+def _archive_chunks(candidates, archive, chunk_size: int, pause: float) -> int:
+    archived = 0
+    while True:
+        with get_engine().begin() as conn:
+            ids = conn.scalars(candidates.limit(chunk_size)).all()
+            if not ids:
+                return archived
+            archive(conn, ids, models.utcnow())
+        archived += len(ids)
+        time.sleep(pause)  # Даем пройти конкурирующим транзакциям
+
+
+def archive_inactive(older_than_days: int = ARCHIVE_AFTER_DAYS, chunk_size: int = 1000, pause: float = 0.05) -> dict:
+    """Переносит в архив задачи, а затем колонки, неактивные дольше older_than_days дней."""
+    cutoff = models.utcnow() - timedelta(days=older_than_days)
+    tasks = select(Task.id).where(Task.is_active == False, Task.deactivated_at < cutoff).order_by(Task.id)
+    # Колонка уходит, только когда в горячей таблице не осталось ее задач (в т.ч. восстановленных)
+    columns = select(Column.id).where(
+        Column.is_active == False,
+        Column.deactivated_at < cutoff,
+        ~exists().where(Task.column_id == Column.id)
+    ).order_by(Column.id)
+    return {
+        "tasks": _archive_chunks(tasks, _archive_tasks, chunk_size, pause),
+        "columns": _archive_chunks(columns, _archive_columns, chunk_size, pause),
+    }
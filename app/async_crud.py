@@ -0,0 +1,123 @@
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import auth, crud, models, schemas, search
+from .pagination import paginate_async
+
+
+# Асинхронные версии функций crud.py для async def обработчиков. Страницы и
+# поиск возвращают только строки колонок columns (без ORM-объектов).
+
+def _select(columns: list, keys: list):
+    """Кортежи columns + недостающие ключи пагинации в конце (как crud._select)."""
+    names = {column.key for column in columns}
+    return select(*columns, *[key for key in keys if key.key not in names])
+
+def _user_projects_filter(user_id: int):
+    """Активные проекты, где пользователь владелец или участник."""
+    is_member = exists().where(
+        models.ProjectMember.project_id == models.Project.id,
+        models.ProjectMember.user_id == user_id
+    )
+    return or_(models.Project.owner_id == user_id, is_member), models.Project.is_active == True
+
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    """Проверяет email и пароль пользователя."""
+    user = await get_user_by_email(db, email)
+    if not user:
+        await auth.verify_dummy_password(password)  # Время ответа не выдает, есть ли такой email
+        return None  # Пользователь не найден
+    if not await auth.verify_password_async(password, user.hashed_password):
+        return None  # Пароль неверный
+    return user  # Аутентификация успешна
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await auth.get_password_hash_async(user.password)
+    db_user = models.User(email=user.email, hashed_password=hashed_password)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+
+async def get_board(db: AsyncSession, project_id: int, priority: int = None):
+    """crud.get_board на AsyncSession: проект, колонки и задачи за три запроса."""
+    task_criteria = models.Task.is_active == True
+    if priority is not None:
+        task_criteria = task_criteria & (models.Task.priority == priority)
+    result = await db.execute(select(models.Project).options(
+        selectinload(models.Project.columns.and_(models.Column.is_active == True))
+        .selectinload(models.Column.tasks.and_(task_criteria))
+    ).where(
+        models.Project.id == project_id,
+        models.Project.is_active == True
+    ))
+    return result.scalars().first()
+
+
+async def get_tasks_by_column(
+    db: AsyncSession, column_id: int, priority: int = None, limit: int = None, cursor: str = None, *, columns: list
+):
+    keys = [models.Task.rank, models.Task.id]
+    statement = _select(columns, keys).where(models.Task.column_id == column_id, models.Task.is_active == True)
+    if priority is not None:
+        statement = statement.where(models.Task.priority == priority)
+    return await paginate_async(db, statement, keys, limit, cursor)
+
+async def get_task_logs(db: AsyncSession, task_id: int, limit: int = None, cursor: str = None, *, columns: list):
+    keys = [models.TaskLog.created_at, models.TaskLog.id]
+    statement = _select(columns, keys).where(models.TaskLog.task_id == task_id)
+    return await paginate_async(db, statement, keys, limit, cursor)
+
+async def search_tasks(db: AsyncSession, project_id: int, q: str, limit: int = 50, *, columns: list):
+    statement = search.search_query(project_id, q, columns, limit)
+    if statement is None:
+        return []
+    return (await db.execute(statement)).all()
+
+async def get_user_projects(db: AsyncSession, user_id: int):
+    """crud.get_user_projects: проекты одним запросом, участники - пакетно."""
+    result = await db.execute(
+        select(models.Project).options(selectinload(models.Project.members)).where(*_user_projects_filter(user_id))
+    )
+    return result.scalars().all()
+
+async def get_active_task_counts(db: AsyncSession, project_ids: list[int]) -> dict[int, int]:
+    if not project_ids:
+        return {}
+    if crud.TASK_COUNTERS_ENABLED:
+        counter = models.ColumnTaskCounter
+        statement = select(counter.project_id, func.sum(counter.active_tasks)).where(
+            counter.project_id.in_(project_ids)
+        ).group_by(counter.project_id)
+    else:
+        statement = select(models.Column.project_id, func.count(models.Task.id)).join(
+            models.Task, models.Task.column_id == models.Column.id
+        ).where(
+            models.Column.project_id.in_(project_ids),
+            models.Task.is_active == True
+        ).group_by(models.Column.project_id)
+    result = await db.execute(statement)
+    return {project_id: int(count or 0) for project_id, count in result}
+
+
+# Versions
+async def get_column_version(db: AsyncSession, column_id: int):
+    result = await db.execute(
+        select(func.coalesce(models.ProjectVersion.version, 0)).select_from(models.Column).outerjoin(
+            models.ProjectVersion, models.ProjectVersion.project_id == models.Column.project_id
+        ).where(models.Column.id == column_id)
+    )
+    return result.scalar()
+
+async def get_user_projects_version(db: AsyncSession, user_id: int) -> tuple:
+    result = await db.execute(
+        select(models.Project.id, func.coalesce(models.ProjectVersion.version, 0)).outerjoin(
+            models.ProjectVersion, models.ProjectVersion.project_id == models.Project.id
+        ).where(*_user_projects_filter(user_id)).order_by(models.Project.id)
+    )
+    return tuple((project_id, version) for project_id, version in result)
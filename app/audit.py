@@ -0,0 +1,141 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import delete, insert, select
+from . import models
+from .database import get_engine
+
+# Журнал изменений задач (task_logs) пишется не в транзакции запроса, а
+# фоновым потоком: мутаторы crud.py кладут событие в ограниченную очередь,
+# поток вставляет их пачками каждые AUDIT_BATCH_SIZE событий или
+# AUDIT_FLUSH_INTERVAL секунд.
+
+AUDIT_QUEUE_SIZE = 10000
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 0.2
+# Сколько мутатор ждет места в переполненной очереди, прежде чем событие будет отброшено
+AUDIT_PUT_TIMEOUT = 1.0
+
+logger = logging.getLogger(__name__)
+_STOP = object()
+
+
+class AuditWriter:
+    def __init__(self, queue_size: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def log(self, task_id: int, user_id: int, message: str):
+        self._ensure_started()
+        event = {"task_id": task_id, "user_id": user_id, "message": message, "created_at": models.utcnow()}
+        try:
+            # Обратное давление: при переполнении мутатор ждет, но не бесконечно
+            self._queue.put(event, timeout=AUDIT_PUT_TIMEOUT)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Очередь аудита переполнена, событие задачи %s отброшено", task_id)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Записывает все накопленные события и останавливает поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        # Остаток очереди при остановке
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+
+    def _write(self, batch: list):
+        try:
+            with get_engine().begin() as conn:
+                conn.execute(insert(models.TaskLog), batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Не удалось записать %s событий аудита", len(batch))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+audit_writer = AuditWriter(AUDIT_QUEUE_SIZE, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL)
+atexit.register(audit_writer.stop)
+
+
+def log_task(task_id: int, user_id: int, message: str):
+    audit_writer.log(task_id, user_id, message)
+
+
+def purge_task_logs(older_than_days: int, chunk_size: int = 1000, pause: float = 0.05) -> int:
+    """Удаляет старые записи порциями по id, каждая в своей короткой транзакции."""
+    cutoff = models.utcnow() - timedelta(days=older_than_days)
+    deleted = 0
+    while True:
+        with get_engine().begin() as conn:
+            ids = conn.scalars(
+                select(models.TaskLog.id).where(models.TaskLog.created_at < cutoff)
+                .order_by(models.TaskLog.id).limit(chunk_size)
+            ).all()
+            if not ids:
+                return deleted
+            conn.execute(delete(models.TaskLog).where(models.TaskLog.id.in_(ids)))
+        deleted += len(ids)
+        time.sleep(pause)  # Даем пройти конкурирующим транзакциям
+
@@ -1,11 +1,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from . import crud, models, schemas
-from .database import get_db
-from passlib.context import CryptContext
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import async_crud, config, metrics, models, schemas
+from .cache import TTLCache
+from .database import get_async_db
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Секретный ключ и алгоритм
 SECRET_KEY = "123"
@@ -13,39 +18,136 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Кэш пользователей по subject токена: без SELECT users на каждый запрос
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL = 60
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# Разобранные токены: admission.py и get_current_user проверяют подпись один раз
+TOKEN_CACHE_SIZE = 10000
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Легкий пользователь, не привязанный к сессии БД."""
+    id: int
+    email: str
+    is_active: bool
+
+
+def invalidate_principal(email: str):
+    principal_cache.invalidate(email)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_principal(target.email)
+    # Старый email тоже сбрасываем, если он менялся
+    for email in inspect(target).attrs.email.history.deleted or ():
+        invalidate_principal(email)
+
 
 async def get_current_user(
         token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-
-    user = crud.get_user_by_email(db, email=email)
+        db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    principal = await resolve_principal(token, db)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+def decode_token(token: str):
+    """Содержимое JWT или None, если токен недействителен; из кэша, пока токен не истек."""
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        token_cache.set(token, payload, payload["exp"] - time.time() if "exp" in payload else None)
+    return payload
+
+async def resolve_principal(token: str, db: AsyncSession):
+    """Пользователь по JWT или None, если токен недействителен."""
+    payload = decode_token(token)
+    if payload is None:
+        return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+
+    user = await async_crud.get_user_by_email(db, email=email)
     if user is None:
-        raise credentials_exception
-    return user
+        return None
+    principal = Principal(id=user.id, email=user.email, is_active=user.is_active)
+    # Запись не переживает токен, которым ее заполнили
+    ttl = payload["exp"] - time.time() if "exp" in payload else None
+    principal_cache.set(email, principal, ttl)
+    return principal
 
-from passlib.context import CryptContext
+_pwd_context = None
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def get_pwd_context():
+    # passlib и backend bcrypt загружаются при первой проверке пароля, а не при импорте
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
 
 def verify_password(plain_password: str, hashed_password: str):
     """Проверяет пароль."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+# bcrypt выполняется в отдельном пуле потоков, а не в event loop (размеры - в config.py)
+hash_executor = ThreadPoolExecutor(max_workers=config.HASH_POOL_SIZE, thread_name_prefix="bcrypt")
+_hash_pending = 0
+_dummy_hash = None
+
+
+async def _run_hashing(func, *args):
+    global _hash_pending
+    if _hash_pending >= config.HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен, повторите попытку позже",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pending += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+        metrics.record_hashing(time.perf_counter() - started)
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await _run_hashing(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str):
+    return await _run_hashing(get_password_hash, password)
+
+async def verify_dummy_password(plain_password: str):
+    """Проверка против фиктивного хэша, чтобы ответ для неизвестного email занимал столько же времени."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await get_password_hash_async("dummy-password")
+    await verify_password_async(plain_password, _dummy_hash)
+    return False
+
+def hashing_stats() -> dict:
+    return {"pool_size": config.HASH_POOL_SIZE, "pending": _hash_pending, "max_pending": config.HASH_MAX_PENDING}
 
 def create_access_token(data: dict):
     """Создает JWT-токен."""
@@ -0,0 +1,71 @@
+import os
+
+# Настройки берутся из переменных окружения; значения по умолчанию - прежние
+# (локальный SQL Server с доверенным подключением).
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Формат строки подключения для SQL Server:
+# mssql+pyodbc://<username>:<password>@<server>/<database>?driver=ODBC+Driver+17+for+SQL+Server
+# Для локального запуска: sqlite:///./kanban.db (файл, а не :memory: - sync и async
+# движки должны видеть одну и ту же базу)
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    "mssql+pyodbc://@localhost/kanban?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes",
+)
+# Если не задан, выводится из DATABASE_URL (aioodbc / aiosqlite)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+# Реплика для GET-обработчиков (см. replica.py); не задана - все читают с основной базы
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+# Реплика для async def обработчиков; если не задан, выводится из READ_DATABASE_URL
+ASYNC_READ_DATABASE_URL = os.getenv("ASYNC_READ_DATABASE_URL")
+# Сколько секунд после записи клиент читает с основной базы (задержка репликации)
+READ_STICKY_SECONDS = _env_float("READ_STICKY_SECONDS", 5.0)
+
+# Пул соединений; рассчитывается на воркер: pool_size + max_overflow соединений максимум
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+# Пакетная передача параметров executemany в pyodbc
+DB_FAST_EXECUTEMANY = _env_bool("DB_FAST_EXECUTEMANY", True)
+DB_ECHO = _env_bool("DB_ECHO", False)
+
+# bcrypt в отдельном пуле потоков (см. auth.py): число потоков и сколько операций
+# может ждать пул; сверх HASH_MAX_PENDING логин сразу получает 503
+HASH_POOL_SIZE = _env_int("HASH_POOL_SIZE", 4)
+HASH_MAX_PENDING = _env_int("HASH_MAX_PENDING", 64)
+
+# Журнал медленных запросов с их SQL (см. metrics.py): доля запросов, для которых
+# собирается текст SQL (0 - выключен), и порог длительности
+SLOW_REQUEST_SAMPLE_RATE = _env_float("SLOW_REQUEST_SAMPLE_RATE", 0.0)
+SLOW_REQUEST_MS = _env_int("SLOW_REQUEST_MS", 500)
+
+# Допуск запросов (см. admission.py): token bucket на пользователя (subject JWT)
+# или IP, отдельный - на /token по IP; общий предел одновременных запросов по
+# размеру пула БД и предел на один ключ. Сверх предела - сразу 429/503.
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED", True)
+ADMISSION_RATE = _env_float("ADMISSION_RATE", 10.0)
+ADMISSION_BURST = _env_int("ADMISSION_BURST", 20)
+LOGIN_RATE = _env_float("LOGIN_RATE", 1.0)
+LOGIN_BURST = _env_int("LOGIN_BURST", 10)
+ADMISSION_MAX_IN_FLIGHT = _env_int("ADMISSION_MAX_IN_FLIGHT", DB_POOL_SIZE + DB_MAX_OVERFLOW)
+ADMISSION_MAX_IN_FLIGHT_PER_KEY = _env_int("ADMISSION_MAX_IN_FLIGHT_PER_KEY", 4)
+# Сколько доверенных прокси стоит перед приложением: IP клиента для лимитов
+# берется из X-Forwarded-For, дописанного ими (0 - заголовок не читается)
+FORWARDED_PROXIES = _env_int("FORWARDED_PROXIES", 0)
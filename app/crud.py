@@ -1,16 +1,46 @@
+from datetime import date, datetime, timedelta
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
-from . import models, schemas
+from sqlalchemy.orm import Session, selectinload
+from . import analytics, audit, events, models, schemas, search, snapshots
+from .access import OWNER, project_access
 from .auth import get_password_hash
 from .auth import verify_password
-from sqlalchemy import func
+from .database import insert_or_update
+from sqlalchemy import delete, exists, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from .models import Task, Column
+from .pagination import paginate
+from .ranking import REBALANCE_RANK_LENGTH, evenly_spaced_ranks, rank_after, rank_between
+
+# Читать количество задач из column_task_counters вместо COUNT по tasks
+TASK_COUNTERS_ENABLED = True
+# Ответ 409, когда клиент правит строку по устаревшей версии
+VERSION_CONFLICT_DETAIL = "Версия устарела: данные изменены другим запросом"
+NEIGHBOUR_ORDER_DETAIL = "Задача after_task_id должна стоять раньше before_task_id"
+
+
+def response_columns(model, schema) -> list:
+    """Колонки модели в порядке полей схемы ответа - для выборки строк вместо ORM-объектов."""
+    return [getattr(model, field) for field in schema.model_fields]
+
+USER_RESPONSE_COLUMNS = response_columns(models.User, schemas.UserResponse)
+PROJECT_RESPONSE_COLUMNS = response_columns(models.Project, schemas.ProjectResponse)
+TASK_RESPONSE_COLUMNS = response_columns(models.Task, schemas.TaskResponse)
+TASK_LOG_RESPONSE_COLUMNS = response_columns(models.TaskLog, schemas.TaskLogResponse)
+
+def _select(db: Session, model, columns: list, keys: list):
+    """ORM-объекты, либо кортежи columns + недостающие ключи пагинации в конце."""
+    if columns is None:
+        return db.query(model)
+    names = {column.key for column in columns}
+    return db.query(*columns, *[key for key in keys if key.key not in names])
 
 
 # Users
-def get_users(db: Session):
-    """Возвращает список всех пользователей."""
-    return db.query(models.User).all()
+def get_users(db: Session, limit: int = None, cursor: str = None, columns: list = None):
+    """Возвращает страницу пользователей и курсор следующей страницы."""
+    keys = [models.User.id]
+    return paginate(_select(db, models.User, columns, keys), keys, limit, cursor)
 
 def create_user(db: Session, user: schemas.UserCreate):
     hashed_password = get_password_hash(user.password)  # Используем хеширование
@@ -25,6 +55,7 @@ def create_project(db: Session, project: schemas.ProjectCreate, owner_id: int):
     db_project = models.Project(**project.model_dump(), owner_id=owner_id)
     db.add(db_project)
     db.commit()
+    project_access.invalidate(owner_id)
     db.refresh(db_project)
     return db_project
 
@@ -32,6 +63,7 @@ def add_user_to_project(db: Session, project_id: int, user_id: int):
     db_member = models.ProjectMember(project_id=project_id, user_id=user_id)
     db.add(db_member)
     db.commit()
+    project_access.invalidate(user_id)
     return db_member
 
 # Tasks
@@ -39,15 +71,19 @@ def create_task(db: Session, task: schemas.TaskCreate, column_id: int, author_id
     # Проверка активности проекта через колонку
     column = db.query(models.Column).filter(
         models.Column.id == column_id,
+        models.Column.is_active == True,
         models.Column.project.has(is_active=True)
     ).first()
     if not column:
         raise HTTPException(status_code=404, detail="Колонка или проект неактивны")
-    # Создание задачи...
-    db_task = models.Task(**task.model_dump(), column_id=column_id, author_id=author_id)
+    # Создание задачи в конец колонки
+    rank = rank_after(_last_rank(db, column_id))
+    db_task = models.Task(**task.model_dump(), column_id=column_id, author_id=author_id, rank=rank)
     db.add(db_task)
+    _bump_task_counter(db, column_id, 1, project_id=column.project_id)
     db.commit()
     db.refresh(db_task)
+    audit.log_task(db_task.id, author_id, "Задача создана")
     return db_task
 
 def get_user_by_email(db: Session, email: str):
@@ -80,24 +116,67 @@ def delete_project(db: Session, project_id: int):
     project = get_project(db, project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
-    project.is_active = False  # Мягкое удаление
+    stamp = models.utcnow()
+    project.is_active = False  # Мягкое удаление, каскадом на колонки и задачи
+    project.deactivated_at = stamp
+    project_columns = select(Column.id).where(Column.project_id == project_id)
+    _cascade_tasks(db, Task.column_id.in_(project_columns), False, stamp)
+    _cascade_columns(db, Column.project_id == project_id, False, stamp)
+    _refresh_task_counters(db, models.ColumnTaskCounter.project_id == project_id)
     db.commit()
+    events.hub.publish(project_id, events.RESYNC_EVENT)
     return {"message": "Проект деактивирован"}
 
 def restore_project(db: Session, project_id: int):
     project = db.query(models.Project).filter(models.Project.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Проект не найден")
-    project.is_active = True  # Восстановление
+    stamp = project.deactivated_at
+    project.is_active = True  # Восстановление вместе с тем, что было деактивировано каскадом
+    project.deactivated_at = None
+    if stamp is not None:
+        project_columns = select(Column.id).where(Column.project_id == project_id)
+        _cascade_tasks(db, Task.column_id.in_(project_columns), True, stamp)
+        _cascade_columns(db, Column.project_id == project_id, True, stamp)
+        _refresh_task_counters(db, models.ColumnTaskCounter.project_id == project_id)
     db.commit()
+    events.hub.publish(project_id, events.RESYNC_EVENT)
     return {"message": "Проект восстановлен"}
-def update_project(db: Session, project_id: int, new_name: str):
-    db_project = db.query(models.Project).filter(models.Project.id == project_id).first()
-    db_project.name = new_name
+
+def update_project(db: Session, project_id: int, new_name: str, user_id: int, version: int = None):
+    db_project = _update_versioned(
+        db, models.Project, project_id, version, {"name": new_name}, models.Project.owner_id == user_id,
+        not_found="Проект не найден"
+    )
+    snapshots.bump_versions(db, {project_id})
+    db.expunge(db_project)  # Иначе commit пометит строку устаревшей и ответ перечитает ее
     db.commit()
-    db.refresh(db_project)
     return db_project
 
+def _update_versioned(db: Session, model, object_id: int, version: int, values: dict, *criteria, not_found: str):
+    """Правка активной строки одним UPDATE ... RETURNING (OUTPUT на SQL Server) без SELECT до и после.
+
+    Права (criteria) и версия проверяются в WHERE, версия увеличивается тем же
+    запросом. Если строка не обновилась, второй запрос только выбирает ответ:
+    404, 409 при другой версии или 403. version=None - правка без проверки версии.
+    Хуки after_flush не срабатывают: индекс, версии проекта и события - на вызывающем.
+    """
+    query = update(model).where(model.id == object_id, model.is_active == True, *criteria)
+    if version is not None:
+        query = query.where(model.version == version)
+    obj = db.execute(
+        query.values(**values, version=model.version + 1).returning(model),
+        execution_options={"synchronize_session": False, "populate_existing": True}
+    ).scalar()
+    if obj is not None:
+        return obj
+    current = db.query(model.version).filter(model.id == object_id, model.is_active == True).scalar()
+    if current is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    if version is not None and current != version:
+        raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL)
+    raise HTTPException(status_code=403, detail="Недостаточно прав")
+
 def get_column(db: Session, column_id: int):
     return db.query(models.Column).filter(models.Column.id == column_id, models.Column.is_active == True).first()
 
@@ -105,24 +184,73 @@ def delete_column(db: Session, column_id: int):
     column = get_column(db, column_id)
     if not column:
         raise HTTPException(status_code=404, detail="Колонка не найдена")
-    column.is_active = False  # Мягкое удаление
+    _deactivate_column(db, column, models.utcnow())
     db.commit()
+    events.publish_resync(db, column_id)
     return {"message": "Колонка деактивирована"}
 
 def restore_column(db: Session, column_id: int):
     column = db.query(models.Column).filter(models.Column.id == column_id).first()
     if not column:
         raise HTTPException(status_code=404, detail="Колонка не найдена")
-    column.is_active = True  # Восстановление
+    _restore_column(db, column)
     db.commit()
+    events.publish_resync(db, column_id)
     return {"message": "Колонка восстановлена"}
 
-def update_column(db: Session, column_id: int, new_name: str, new_order: int):
-    db_column = get_column(db, column_id)
-    db_column.name = new_name
-    db_column.order = new_order
+def _deactivate_column(db: Session, column: models.Column, stamp: datetime):
+    column.is_active = False  # Мягкое удаление, каскадом на задачи
+    column.deactivated_at = stamp
+    _cascade_tasks(db, Task.column_id == column.id, False, stamp)
+    _refresh_task_counters(db, models.ColumnTaskCounter.column_id == column.id)
+
+def _restore_column(db: Session, column: models.Column):
+    stamp = column.deactivated_at
+    column.is_active = True  # Восстановление
+    column.deactivated_at = None
+    if stamp is not None:
+        _cascade_tasks(db, Task.column_id == column.id, True, stamp)
+        _refresh_task_counters(db, models.ColumnTaskCounter.column_id == column.id)
+
+# Каскад мягкого удаления - по одному UPDATE на таблицу, без загрузки строк в сессию.
+# Дочерние строки получают deactivated_at родителя; восстановление возвращает только
+# их, а удаленные раньше и отдельно остаются удаленными.
+
+def _cascade_tasks(db: Session, criterion, active: bool, stamp: datetime):
+    _cascade(db, Task, criterion, active, stamp)
+
+def _cascade_columns(db: Session, criterion, active: bool, stamp: datetime):
+    _cascade(db, Column, criterion, active, stamp)
+
+def _cascade(db: Session, model, criterion, active: bool, stamp: datetime):
+    if active:
+        db.query(model).filter(criterion, model.is_active == False, model.deactivated_at == stamp).update(
+            {model.is_active: True, model.deactivated_at: None}, synchronize_session=False
+        )
+    else:
+        db.query(model).filter(criterion, model.is_active == True).update(
+            {model.is_active: False, model.deactivated_at: stamp}, synchronize_session=False
+        )
+
+def _refresh_task_counters(db: Session, criterion):
+    """Пересчитывает счетчики колонок одним UPDATE с коррелированным COUNT (после каскада)."""
+    if not TASK_COUNTERS_ENABLED:
+        return
+    counter = models.ColumnTaskCounter
+    active_tasks = select(func.count(Task.id)).where(
+        Task.column_id == counter.column_id, Task.is_active == True
+    ).scalar_subquery()
+    db.query(counter).filter(criterion).update({counter.active_tasks: active_tasks}, synchronize_session=False)
+
+def update_column(db: Session, column_id: int, new_name: str, new_order: int, version: int = None):
+    # Владельца проекта проверяет зависимость access.column_owner
+    db_column = _update_versioned(
+        db, Column, column_id, version, {"name": new_name, "order": new_order}, not_found="Колонка не найдена"
+    )
+    snapshots.bump_versions(db, {db_column.project_id})
+    events.collect_change(db, db_column)
+    db.expunge(db_column)
     db.commit()
-    db.refresh(db_column)
     return db_column
 
 
@@ -130,29 +258,44 @@ def update_column(db: Session, column_id: int, new_name: str, new_order: int):
 def get_task(db: Session, task_id: int):
     return db.query(models.Task).filter(models.Task.id == task_id, models.Task.is_active == True).first()
 
-def delete_task(db: Session, task_id: int):
+def delete_task(db: Session, task_id: int, user_id: int):
     task = get_task(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Задача не найдена")
     task.is_active = False  # Мягкое удаление
+    task.deactivated_at = models.utcnow()
+    _bump_task_counter(db, task.column_id, -1)
     db.commit()
+    audit.log_task(task_id, user_id, "Задача удалена")
     return {"message": "Задача деактивирована"}
 
-def restore_task(db: Session, task_id: int):
+def restore_task(db: Session, task_id: int, user_id: int):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Задача не найдена")
-    task.is_active = True  # Восстановление
+    if not task.is_active:
+        task.is_active = True  # Восстановление
+        task.deactivated_at = None
+        _bump_task_counter(db, task.column_id, 1)
     db.commit()
+    audit.log_task(task_id, user_id, "Задача восстановлена")
     return {"message": "Задача восстановлена"}
 
-def update_task(db: Session, task_id: int, new_title: str, new_description: str, new_priority: int):
-    db_task = get_task(db, task_id)
-    db_task.title = new_title
-    db_task.description = new_description
-    db_task.priority = new_priority
+def update_task(
+    db: Session, task_id: int, new_title: str, new_description: str, new_priority: int, user_id: int,
+    version: int = None
+):
+    db_task = _update_versioned(
+        db, Task, task_id, version, {"title": new_title, "description": new_description, "priority": new_priority},
+        Task.author_id == user_id, not_found="Задача не найдена"
+    )
+    project_id = events.column_project_id(db, db_task.column_id)
+    search.index_tasks(db.connection(), [(db_task, project_id)])
+    snapshots.bump_versions(db, {project_id})
+    events.collect_change(db, db_task)
+    db.expunge(db_task)
     db.commit()
-    db.refresh(db_task)
+    audit.log_task(task_id, user_id, "Задача изменена")
     return db_task
 
 
@@ -167,20 +310,439 @@ def remove_user_from_project(db: Session, project_id: int, user_id: int):
 
     db.delete(member)
     db.commit()
+    project_access.invalidate(user_id)
     return {"message": "Пользователь удален из проекта"}
-def get_tasks_by_column(db: Session, column_id: int, priority: int = None):
-    query = db.query(models.Task).filter(models.Task.column_id == column_id, models.Task.is_active == True)
+def get_tasks_by_column(
+    db: Session, column_id: int, priority: int = None, limit: int = None, cursor: str = None, columns: list = None
+):
+    keys = [models.Task.rank, models.Task.id]
+    query = _select(db, models.Task, columns, keys).filter(models.Task.column_id == column_id, models.Task.is_active == True)
     if priority is not None:
         query = query.filter(models.Task.priority == priority)
-    return query.all()
+    return paginate(query, keys, limit, cursor)
+
+def get_projects(
+    db: Session, user_id: int, is_active: bool = True, limit: int = None, cursor: str = None, columns: list = None
+):
+    """Страница проектов, где пользователь владелец или участник."""
+    is_member = exists().where(
+        models.ProjectMember.project_id == models.Project.id,
+        models.ProjectMember.user_id == user_id
+    )
+    keys = [models.Project.id]
+    query = _select(db, models.Project, columns, keys).filter(
+        or_(models.Project.owner_id == user_id, is_member),
+        models.Project.is_active == is_active
+    )
+    return paginate(query, keys, limit, cursor)
+
+def get_task_logs(db: Session, task_id: int, limit: int = None, cursor: str = None, columns: list = None):
+    keys = [models.TaskLog.created_at, models.TaskLog.id]
+    query = _select(db, models.TaskLog, columns, keys).filter(models.TaskLog.task_id == task_id)
+    return paginate(query, keys, limit, cursor)
+
+def get_task_count_by_project(db: Session, project_id: int):
+    return db.query(func.count(Task.id)).join(Column).filter(
+        Column.project_id == project_id,
+        Task.is_active == True
+    ).scalar()
+
+
+# Ordering
+def _last_rank(db: Session, column_id: int, exclude_task_id: int = None):
+    """Наибольший ранг в колонке - один seek по индексу (column_id, rank)."""
+    query = db.query(func.max(Task.rank)).filter(Task.column_id == column_id)
+    if exclude_task_id is not None:
+        query = query.filter(Task.id != exclude_task_id)
+    return query.scalar()
+
+def _neighbour_rank(db: Session, task_id: int, column_id: int):
+    row = db.query(Task.rank, Task.column_id).filter(Task.id == task_id).first()
+    if not row or row.column_id != column_id:
+        raise HTTPException(status_code=400, detail="Соседняя задача не найдена в колонке")
+    return row.rank
+
+def _move_bounds(db: Session, task: models.Task, column_id: int, after_task_id: int, before_task_id: int):
+    """Ранги соседей, между которыми встанет задача (None - край колонки)."""
+    others = (Task.column_id == column_id, Task.id != task.id)
+    if after_task_id is not None:
+        low = _neighbour_rank(db, after_task_id, column_id)
+        if before_task_id is not None:
+            high = _neighbour_rank(db, before_task_id, column_id)
+            # Порядок в колонке - (rank, id): при совпадающих рангах решает id
+            if (low, after_task_id) >= (high, before_task_id):
+                raise HTTPException(status_code=400, detail=NEIGHBOUR_ORDER_DETAIL)
+        else:
+            high = db.query(func.min(Task.rank)).filter(*others, Task.rank > low).scalar()
+    elif before_task_id is not None:
+        high = _neighbour_rank(db, before_task_id, column_id)
+        low = db.query(func.max(Task.rank)).filter(*others, Task.rank < high).scalar()
+    else:
+        low, high = _last_rank(db, column_id, exclude_task_id=task.id), None
+    return low, high
+
+def move_task(
+    db: Session, task_id: int, column_id: int, user_id: int, after_task_id: int = None, before_task_id: int = None
+):
+    """Перемещает задачу в колонку и позицию; пишется только сама задача."""
+    if task_id in (after_task_id, before_task_id):
+        raise HTTPException(status_code=400, detail="Задача не может быть соседом самой себя")
+    task = get_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    target = db.query(models.Column).filter(
+        models.Column.id == column_id,
+        models.Column.is_active == True,
+        models.Column.project.has(is_active=True)
+    ).first()
+    if not target:
+        raise HTTPException(status_code=404, detail="Колонка или проект неактивны")
+    if target.id != task.column_id:
+        source_project_id = db.query(Column.project_id).filter(Column.id == task.column_id).scalar()
+        if source_project_id != target.project_id:
+            raise HTTPException(status_code=400, detail="Колонка из другого проекта")
+
+    low, high = _move_bounds(db, task, column_id, after_task_id, before_task_id)
+    if low == "" or (high is not None and (low or "") >= high):
+        # Старые задачи без рангов или совпадающие ранги - сначала перенумеровать колонку
+        rebalance_column(db, column_id)
+        low, high = _move_bounds(db, task, column_id, after_task_id, before_task_id)
+        if high is not None and (low or "") >= high:
+            raise HTTPException(status_code=400, detail=NEIGHBOUR_ORDER_DETAIL)
+
+    source_column_id = task.column_id
+    task.column_id = target.id
+    task.rank = rank_after(low) if high is None else rank_between(low, high)
+    # Счетчики после переноса: недостающий счетчик инициализируется уже с учетом задачи
+    if target.id != source_column_id and task.is_active:
+        _bump_task_counter(db, source_column_id, -1)
+        _bump_task_counter(db, target.id, 1, project_id=target.project_id)
+    db.commit()
+    db.refresh(task)
+    audit.log_task(task_id, user_id, f"Задача перемещена в колонку {column_id}")
+    return task
+
+def needs_rebalance(task: models.Task) -> bool:
+    return len(task.rank) > REBALANCE_RANK_LENGTH
+
+def rebalance_column(db: Session, column_id: int):
+    """Равномерно перенумеровывает ранги колонки, сохраняя текущий порядок."""
+    task_ids = [row.id for row in db.query(Task.id).filter(Task.column_id == column_id).order_by(Task.rank, Task.id)]
+    ranks = evenly_spaced_ranks(len(task_ids))
+    db.bulk_update_mappings(models.Task, [
+        {"id": task_id, "rank": rank} for task_id, rank in zip(task_ids, ranks)
+    ])
+    snapshots.bump_versions(db, {events.column_project_id(db, column_id)})
+    db.commit()
+    events.publish_resync(db, column_id)
 
-def get_projects(db: Session, is_active: bool = True):
-    return db.query(models.Project).filter(models.Project.is_active == is_active).all()
 
-def get_task_logs(db: Session, task_id: int):
-    return db.query(models.TaskLog).filter(models.TaskLog.task_id == task_id).all()
+def get_board(db: Session, project_id: int, priority: int = None):
+    """Загружает проект с активными колонками и задачами за три запроса (проект, колонки, задачи)."""
+    task_criteria = models.Task.is_active == True
+    if priority is not None:
+        task_criteria = task_criteria & (models.Task.priority == priority)
+    return db.query(models.Project).options(
+        selectinload(models.Project.columns.and_(models.Column.is_active == True))
+        .selectinload(models.Column.tasks.and_(task_criteria))
+    ).filter(
+        models.Project.id == project_id,
+        models.Project.is_active == True
+    ).first()
 
-def get_task_count_by_project(db: Session, project_id: int):
-    return db.query(func.count(Task.id)).join(Column).filter(Column.project_id == project_id).scalar()
 
+def get_user_projects(db: Session, user_id: int):
+    """Активные проекты, где пользователь владелец или участник, одним запросом; участники подгружаются пакетно."""
+    is_member = exists().where(
+        models.ProjectMember.project_id == models.Project.id,
+        models.ProjectMember.user_id == user_id
+    )
+    return db.query(models.Project).options(selectinload(models.Project.members)).filter(
+        or_(models.Project.owner_id == user_id, is_member),
+        models.Project.is_active == True
+    ).all()
+
+def get_active_task_counts(db: Session, project_ids: list[int]) -> dict[int, int]:
+    """Количество активных задач по проектам одним сгруппированным запросом."""
+    if not project_ids:
+        return {}
+    if TASK_COUNTERS_ENABLED:
+        rows = db.query(
+            models.ColumnTaskCounter.project_id, func.sum(models.ColumnTaskCounter.active_tasks)
+        ).filter(
+            models.ColumnTaskCounter.project_id.in_(project_ids)
+        ).group_by(models.ColumnTaskCounter.project_id).all()
+    else:
+        rows = db.query(Column.project_id, func.count(Task.id)).join(Task, Task.column_id == Column.id).filter(
+            Column.project_id.in_(project_ids),
+            Task.is_active == True
+        ).group_by(Column.project_id).all()
+    return {project_id: int(count or 0) for project_id, count in rows}
+
+def _bump_task_counter(db: Session, column_id: int, delta: int, project_id: int = None):
+    """Изменяет счетчик активных задач колонки на delta; коммит остается за вызывающей функцией."""
+    if not TASK_COUNTERS_ENABLED:
+        return
+    db.flush()
+    counter = update(models.ColumnTaskCounter).where(models.ColumnTaskCounter.column_id == column_id).values(
+        active_tasks=models.ColumnTaskCounter.active_tasks + delta
+    )
+    conn = db.connection()
+    if conn.execute(counter).rowcount:
+        return
+    # Счетчика еще нет (данные до его появления) - считаем колонку целиком один раз;
+    # задачи этой транзакции уже во flush и попадают в подсчет
+    if project_id is None:
+        project_id = db.query(Column.project_id).filter(Column.id == column_id).scalar()
+    active_tasks = db.query(func.count(Task.id)).filter(
+        Task.column_id == column_id,
+        Task.is_active == True
+    ).scalar()
+    insert_or_update(conn, insert(models.ColumnTaskCounter).values(
+        column_id=column_id, project_id=project_id, active_tasks=active_tasks
+    ), counter)
+
+def rebuild_task_counters(db: Session):
+    """Пересчитывает все счетчики активных задач (для существующих баз)."""
+    rebuild_task_counter_rows(db.connection())
+    db.commit()
 
+def rebuild_task_counter_rows(conn):
+    """Заполняет column_task_counters заново одним INSERT ... SELECT; транзакция - у вызывающего."""
+    counter = models.ColumnTaskCounter
+    conn.execute(delete(counter))
+    conn.execute(insert(counter).from_select(
+        ["column_id", "project_id", "active_tasks"],
+        select(Column.id, Column.project_id, func.count(Task.id)).outerjoin(
+            Task, (Task.column_id == Column.id) & (Task.is_active == True)
+        ).group_by(Column.id, Column.project_id)
+    ))
+
+
+# Batch
+MAX_BATCH_SIZE = 1000
+
+def run_batch(db: Session, operations: list[schemas.BatchOperation], user_id: int):
+    """Выполняет операции одной транзакцией: проверки одним запросом на пакет, один flush и один commit."""
+    if len(operations) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Не более {MAX_BATCH_SIZE} операций в пакете")
+
+    # До запросов сессии: на промахе кэша карта ролей читается отдельным соединением
+    roles = project_access.roles(user_id)
+    task_ids = {op.task_id for op in operations if op.task_id is not None}
+    tasks = {t.id: t for t in db.query(Task).filter(Task.id.in_(task_ids))} if task_ids else {}
+    column_ids = {op.column_id for op in operations if op.column_id is not None}
+    column_ids |= {t.column_id for t in tasks.values()}
+    columns = {}
+    if column_ids:
+        rows = db.query(Column, models.Project.is_active).join(models.Project).filter(Column.id.in_(column_ids))
+        columns = {column.id: (column, project_active) for column, project_active in rows}
+    member_pairs = {(op.project_id, op.user_id) for op in operations if op.op == "remove_member"}
+    members = {}
+    if member_pairs:
+        rows = db.query(models.ProjectMember).filter(
+            models.ProjectMember.project_id.in_({p for p, _ in member_pairs}),
+            models.ProjectMember.user_id.in_({u for _, u in member_pairs})
+        )
+        members = {(m.project_id, m.user_id): m for m in rows}
+
+    last_ranks = {}
+    def next_rank(column_id):
+        if column_id not in last_ranks:
+            last_ranks[column_id] = _last_rank(db, column_id)
+        last_ranks[column_id] = rank_after(last_ranks[column_id])
+        return last_ranks[column_id]
+
+    counter_deltas = {}
+    def bump(column_id, delta):
+        counter_deltas[column_id] = counter_deltas.get(column_id, 0) + delta
+
+    def active_column(column_id):
+        column, project_active = columns.get(column_id, (None, False))
+        if not column or not column.is_active or not project_active:
+            raise HTTPException(status_code=404, detail="Колонка или проект неактивны")
+        return column
+
+    def existing_task(task_id, active=True):
+        task = tasks.get(task_id)
+        if not task or (active and not task.is_active):
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        require(columns[task.column_id][0].project_id, "Задача не найдена")
+        return task
+
+    def require(project_id, not_found, role=None):
+        # Как access.require_access: чужой проект - 404, недостаточная роль - 403
+        if project_id not in roles:
+            raise HTTPException(status_code=404, detail=not_found)
+        if role == OWNER and roles[project_id] != OWNER:
+            raise HTTPException(status_code=403, detail="Недостаточно прав")
+
+    results = []
+    column_changes = []  # (колонка, восстановить?) в порядке операций
+    log_messages = []  # (task или task_id, сообщение); id новых задач известен только после flush
+    try:
+        for index, op in enumerate(operations):
+            if op.op in ("create_task", "update_task") and op.task is None:
+                raise HTTPException(status_code=422, detail="Не передано поле task")
+            if op.op == "create_task":
+                require(active_column(op.column_id).project_id, "Колонка или проект неактивны")
+                task = models.Task(
+                    **op.task.model_dump(), column_id=op.column_id, author_id=user_id, rank=next_rank(op.column_id)
+                )
+                db.add(task)
+                bump(op.column_id, 1)
+                results.append(task)
+                log_messages.append((task, "Задача создана"))
+            elif op.op == "update_task":
+                task = existing_task(op.task_id)
+                if task.author_id != user_id:
+                    raise HTTPException(status_code=403, detail="Недостаточно прав")
+                if op.version is not None and task.version != op.version:
+                    raise HTTPException(status_code=409, detail=VERSION_CONFLICT_DETAIL)
+                task.version += 1
+                task.title = op.task.title
+                task.description = op.task.description
+                task.priority = op.task.priority
+                results.append(task)
+                log_messages.append((task, "Задача изменена"))
+            elif op.op == "move_task":
+                task = existing_task(op.task_id)
+                target = active_column(op.column_id)
+                if target.project_id != columns[task.column_id][0].project_id:
+                    raise HTTPException(status_code=400, detail="Колонка из другого проекта")
+                if target.id != task.column_id:
+                    bump(task.column_id, -1)
+                    bump(target.id, 1)
+                task.rank = next_rank(target.id)  # В конец колонки
+                task.column_id = target.id
+                results.append(task)
+                log_messages.append((task, f"Задача перемещена в колонку {target.id}"))
+            elif op.op == "delete_task":
+                task = existing_task(op.task_id)
+                task.is_active = False
+                task.deactivated_at = models.utcnow()
+                bump(task.column_id, -1)
+                results.append({"message": "Задача деактивирована"})
+                log_messages.append((task, "Задача удалена"))
+            elif op.op == "restore_task":
+                task = existing_task(op.task_id, active=False)
+                if not task.is_active:
+                    task.is_active = True
+                    task.deactivated_at = None
+                    bump(task.column_id, 1)
+                results.append({"message": "Задача восстановлена"})
+                log_messages.append((task, "Задача восстановлена"))
+            elif op.op in ("delete_column", "restore_column"):
+                column, _ = columns.get(op.column_id, (None, False))
+                if not column or (op.op == "delete_column" and not column.is_active):
+                    raise HTTPException(status_code=404, detail="Колонка не найдена")
+                require(column.project_id, "Колонка не найдена", OWNER)
+                column_changes.append((column, op.op == "restore_column"))
+                column.is_active = op.op == "restore_column"
+                results.append({"message": "Колонка восстановлена" if column.is_active else "Колонка деактивирована"})
+            elif op.op == "add_member":
+                require(op.project_id, "Проект не найден", OWNER)
+                member = models.ProjectMember(project_id=op.project_id, user_id=op.user_id)
+                db.add(member)
+                members[(op.project_id, op.user_id)] = member
+                results.append({"project_id": op.project_id, "user_id": op.user_id})
+            elif op.op == "remove_member":
+                require(op.project_id, "Проект не найден", OWNER)
+                member = members.pop((op.project_id, op.user_id), None)
+                if not member:
+                    raise HTTPException(status_code=404, detail="Пользователь не состоит в проекте")
+                db.delete(member)
+                results.append({"message": "Пользователь удален из проекта"})
+
+        index = None
+        db.flush()  # Новые задачи вставляются пакетом, created_at возвращается тем же INSERT
+        results = [
+            schemas.TaskResponse.model_validate(result) if isinstance(result, models.Task) else result
+            for result in results
+        ]
+        log_messages = [(task.id, message) for task, message in log_messages]
+        for column_id, delta in counter_deltas.items():
+            if delta:
+                _bump_task_counter(db, column_id, delta)
+        # Каскад на задачи колонок - после flush операций над задачами из этого же пакета
+        stamp = models.utcnow()
+        for column, restore in column_changes:
+            if restore:
+                _restore_column(db, column)
+            else:
+                _deactivate_column(db, column, stamp)
+        resync_column_ids = {column.id for column, _ in column_changes}
+        db.commit()
+    except HTTPException as e:
+        db.rollback()
+        raise HTTPException(status_code=e.status_code, detail={"index": index, "detail": e.detail})
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail={"index": None, "detail": "Нарушение целостности данных"})
+    member_user_ids = {op.user_id for op in operations if op.op in ("add_member", "remove_member")}
+    if member_user_ids:
+        project_access.invalidate(*member_user_ids)
+    for task_id, message in log_messages:
+        audit.log_task(task_id, user_id, message)
+    for column_id in resync_column_ids:
+        events.publish_resync(db, column_id)
+    # Ранги в конец колонки почти не растут, но колонку с длинными рангами
+    # (старые данные, вставки в середину) перенумеровываем, как после move
+    for column_id, rank in last_ranks.items():
+        if len(rank) > REBALANCE_RANK_LENGTH:
+            rebalance_column(db, column_id)
+    return results
+
+
+# Search
+def search_tasks(db: Session, project_id: int, q: str, limit: int = 50, columns: list = None):
+    statement = search.search_query(project_id, q, columns or [models.Task], limit)
+    if statement is None:
+        return []
+    result = db.execute(statement)
+    return result.all() if columns else result.scalars().all()
+
+
+# Analytics
+def _analytics_period(db: Session, project_id: int, days: int, until: date):
+    if not get_project(db, project_id):
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    end = until or models.utcnow().date()
+    return end - timedelta(days=days - 1), end
+
+def get_cumulative_flow(db: Session, project_id: int, days: int, until: date = None):
+    return analytics.cumulative_flow(db, project_id, *_analytics_period(db, project_id, days, until))
+
+def get_lead_time(db: Session, project_id: int, days: int, until: date = None):
+    return analytics.lead_time(db, project_id, *_analytics_period(db, project_id, days, until))
+
+
+# Versions
+def get_task_version(db: Session, task_id: int):
+    """Версия проекта задачи одним запросом; None, если задачи нет."""
+    row = db.query(func.coalesce(models.ProjectVersion.version, 0)).select_from(Task).join(
+        Column, Column.id == Task.column_id
+    ).outerjoin(
+        models.ProjectVersion, models.ProjectVersion.project_id == Column.project_id
+    ).filter(Task.id == task_id).first()
+    return row[0] if row else None
+
+def get_column_version(db: Session, column_id: int):
+    row = db.query(func.coalesce(models.ProjectVersion.version, 0)).select_from(Column).outerjoin(
+        models.ProjectVersion, models.ProjectVersion.project_id == Column.project_id
+    ).filter(Column.id == column_id).first()
+    return row[0] if row else None
+
+def get_user_projects_version(db: Session, user_id: int) -> tuple:
+    """Набор (проект, версия) пользователя: меняется при любом изменении его проектов или членства."""
+    is_member = exists().where(
+        models.ProjectMember.project_id == models.Project.id,
+        models.ProjectMember.user_id == user_id
+    )
+    rows = db.query(models.Project.id, func.coalesce(models.ProjectVersion.version, 0)).outerjoin(
+        models.ProjectVersion, models.ProjectVersion.project_id == models.Project.id
+    ).filter(
+        or_(models.Project.owner_id == user_id, is_member),
+        models.Project.is_active == True
+    ).order_by(models.Project.id).all()
+    return tuple((project_id, version) for project_id, version in rows)
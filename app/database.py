@@ -1,21 +1,241 @@
+import threading
+import time
+from collections import deque
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
 from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from . import config
 
 
-# Формат строки подключения для SQL Server:
-# mssql+pyodbc://<username>:<password>@<server>/<database>?driver=ODBC+Driver+17+for+SQL+Server
-DATABASE_URL = "mssql+pyodbc://@localhost/kanban?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes"
+class PoolTelemetry:
+    """Время ожидания соединения из пула и число таймаутов."""
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def __init__(self, window: int = 1000):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, wait: float, timed_out: bool):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.max_wait = max(self.max_wait, wait)
+            self._waits.append(wait)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+        p95 = waits[int(len(waits) * 0.95) - 1] if waits else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_p95": round(p95 * 1000, 3),
+            "wait_ms_max": round(self.max_wait * 1000, 3),
+        }
+
+
+class _TimedPoolMixin:
+    telemetry: PoolTelemetry
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.telemetry.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.telemetry.record(time.perf_counter() - started, timed_out=False)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() заменяет пул новым - телеметрия переходит к нему
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def async_url_for(url: str) -> str:
+    """Асинхронный драйвер для той же базы."""
+    parsed = make_url(url)
+    drivers = {"mssql": "aioodbc", "sqlite": "aiosqlite", "postgresql": "asyncpg"}
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{drivers[parsed.get_backend_name()]}").render_as_string(
+        hide_password=False
+    )
+
+def engine_options(url: str, is_async: bool) -> dict:
+    parsed = make_url(url)
+    options = {"echo": config.DB_ECHO, "pool_pre_ping": config.DB_POOL_PRE_PING}
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if parsed.database in (None, "", ":memory:"):
+            # Одна общая in-memory база на процесс
+            options["poolclass"] = StaticPool
+            return options
+    options.update(
+        poolclass=TimedAsyncQueuePool if is_async else TimedQueuePool,
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+    )
+    if parsed.drivername == "mssql+pyodbc":
+        options["fast_executemany"] = config.DB_FAST_EXECUTEMANY
+    return options
+
+def make_engine(url: str, name: str = "primary"):
+    # logging_name различает движки в логах и в метрике запросов по движкам (metrics.py)
+    engine = create_engine(url, logging_name=name, **engine_options(url, is_async=False))
+    engine.pool.telemetry = PoolTelemetry()
+    return engine
+
+def make_async_engine(url: str, name: str = "primary_async"):
+    engine = create_async_engine(url, logging_name=name, **engine_options(url, is_async=True))
+    engine.sync_engine.pool.telemetry = PoolTelemetry()
+    return engine
+
+def pool_status(engine) -> dict:
+    pool = getattr(engine, "sync_engine", engine).pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+        )
+    status.update(pool.telemetry.stats())
+    return status
+
+
+DATABASE_URL = config.DATABASE_URL
+ASYNC_DATABASE_URL = config.ASYNC_DATABASE_URL or async_url_for(DATABASE_URL)
+READ_DATABASE_URL = config.READ_DATABASE_URL
+ASYNC_READ_DATABASE_URL = config.ASYNC_READ_DATABASE_URL or (READ_DATABASE_URL and async_url_for(READ_DATABASE_URL))
+
+# Движки создаются при первом обращении: импорт приложения не загружает
+# драйвер БД (pyodbc/aioodbc) и не открывает соединений.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncReadSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+_engine = None
+_async_engine = None
+_read_engine = None
+_async_read_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = make_engine(DATABASE_URL)
+                SessionLocal.configure(bind=_engine)
+    return _engine
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                # Тот же сервер через асинхронный драйвер для async def обработчиков
+                _async_engine = make_async_engine(ASYNC_DATABASE_URL)
+                AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+def get_read_engine():
+    """Движок реплики; без READ_DATABASE_URL - основной."""
+    global _read_engine
+    if READ_DATABASE_URL is None:
+        return get_engine()
+    if _read_engine is None:
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = make_engine(READ_DATABASE_URL, name="replica")
+                ReadSessionLocal.configure(bind=_read_engine)
+    return _read_engine
+
+def get_async_read_engine():
+    """Асинхронный движок реплики; без READ_DATABASE_URL - основной асинхронный."""
+    global _async_read_engine
+    if READ_DATABASE_URL is None:
+        return get_async_engine()
+    if _async_read_engine is None:
+        with _engine_lock:
+            if _async_read_engine is None:
+                _async_read_engine = make_async_engine(ASYNC_READ_DATABASE_URL, name="replica_async")
+                AsyncReadSessionLocal.configure(bind=_async_read_engine)
+    return _async_read_engine
+
+def new_session():
+    get_engine()
+    return SessionLocal()
+
+def new_async_session():
+    get_async_engine()
+    return AsyncSessionLocal()
+
+def new_read_session():
+    if READ_DATABASE_URL is None:
+        return new_session()
+    get_read_engine()
+    return ReadSessionLocal()
+
+def new_async_read_session():
+    if READ_DATABASE_URL is None:
+        return new_async_session()
+    get_async_read_engine()
+    return AsyncReadSessionLocal()
+
+async def dispose_engines():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _async_read_engine is not None:
+        await _async_read_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+    if _read_engine is not None:
+        _read_engine.dispose()
 
 class Base(DeclarativeBase):
     pass
 #Генератор сессий БД
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
         db.close()
 
+#Асинхронный генератор сессий БД - не блокирует event loop
+async def get_async_db():
+    async with new_async_session() as db:
+        yield db
+
+
+def insert_or_update(conn, insert_statement, update_statement):
+    """Вставляет строку, которую не нашел UPDATE счетчика.
+
+    Две транзакции могут одновременно не найти строку и обе вставить ее: тогда
+    PK-конфликт у второй откатывает только savepoint вставки, и она повторяет
+    UPDATE по уже вставленной строке (на SQL Server - после commit первой).
+    """
+    try:
+        with conn.begin_nested():
+            conn.execute(insert_statement)
+    except IntegrityError:
+        conn.execute(update_statement)
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from . import models, schemas
+
+# Лента изменений доски: мутаторы crud.py коммитят изменения, а подписчики
+# /projects/{id}/events получают их без опроса.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Subscriber:
+    """Ограниченная очередь событий одного клиента."""
+    __slots__ = ("project_id", "queue", "dropped")
+
+    def __init__(self, project_id: int, queue_size: int):
+        self.project_id = project_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, message: dict):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Медленный клиент: выбрасываем накопленное и просим перечитать доску
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC_EVENT)
+
+
+class EventHub:
+    """Pub/sub внутри процесса; publish можно вызывать из любого потока."""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.published = 0
+        self._subscribers: dict[int, set[Subscriber]] = {}
+        self._loop = None
+
+    def subscribe(self, project_id: int) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(project_id, self.queue_size)
+        self._subscribers.setdefault(project_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.project_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.project_id]
+
+    def publish(self, project_id: int, message: dict):
+        loop = self._loop
+        if loop is None or project_id not in self._subscribers:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(project_id, message)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, project_id, message)
+
+    def _dispatch(self, project_id: int, message: dict):
+        self.published += 1
+        for subscriber in list(self._subscribers.get(project_id, ())):
+            subscriber.push(message)
+
+    def stats(self) -> dict:
+        return {
+            "projects": len(self._subscribers),
+            "subscribers": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+        }
+
+
+hub = EventHub()
+
+
+# Колонка не переходит между проектами, поэтому соответствие можно кэшировать.
+# Права по нему не проверяются (см. access.py); удаленные архивом колонки
+# убирает forget_columns
+_COLUMN_PROJECT_CACHE_SIZE = 10000
+_column_projects = OrderedDict()
+_column_projects_lock = threading.Lock()
+
+def column_project_id(session: Session, column_id: int):
+    """Проект колонки; после первого обращения - без запроса к БД."""
+    with _column_projects_lock:
+        project_id = _column_projects.get(column_id)
+    if project_id is None:
+        project_id = session.execute(
+            select(models.Column.project_id).where(models.Column.id == column_id)
+        ).scalar()
+        with _column_projects_lock:
+            _column_projects[column_id] = project_id
+            if len(_column_projects) > _COLUMN_PROJECT_CACHE_SIZE:
+                _column_projects.popitem(last=False)
+    return project_id
+
+def forget_columns(column_ids):
+    with _column_projects_lock:
+        for column_id in column_ids:
+            _column_projects.pop(column_id, None)
+
+def _change_type(obj, is_new: bool) -> str:
+    if is_new:
+        return "created"
+    history = inspect(obj).attrs.is_active.history
+    if history.has_changes():
+        return "restored" if obj.is_active else "deleted"
+    return "updated"
+
+def _board_event(session: Session, obj, is_new: bool):
+    if isinstance(obj, models.Task):
+        project_id, kind, schema = column_project_id(session, obj.column_id), "task", schemas.TaskResponse
+    elif isinstance(obj, models.Column):
+        project_id, kind, schema = obj.project_id, "column", schemas.ColumnResponse
+    else:
+        return None
+    if project_id not in hub._subscribers:
+        return None  # Доску никто не слушает - не сериализуем
+    return project_id, {
+        "type": f"{kind}.{_change_type(obj, is_new)}",
+        kind: schema.model_validate(obj).model_dump(mode="json"),
+    }
+
+def collect_change(session: Session, obj):
+    """Событие для строки, измененной UPDATE ... RETURNING в обход flush; уйдет после commit."""
+    board_event = _board_event(session, obj, False)
+    if board_event is not None:
+        session.info.setdefault("board_events", []).append(board_event)
+
+def publish_resync(session: Session, column_id: int):
+    """Для массовых изменений в обход ORM: клиенты перечитывают доску целиком."""
+    hub.publish(column_project_id(session, column_id), RESYNC_EVENT)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_board_events(session: Session, flush_context):
+    if not hub._subscribers:
+        return
+    pending = session.info.setdefault("board_events", [])
+    for obj, is_new in [(o, True) for o in session.new] + [(o, False) for o in session.dirty]:
+        if not is_new and not session.is_modified(obj, include_collections=False):
+            continue
+        board_event = _board_event(session, obj, is_new)
+        if board_event is not None:
+            pending.append(board_event)
+
+@event.listens_for(Session, "after_commit")
+def _publish_board_events(session: Session):
+    for project_id, message in session.info.pop("board_events", ()):
+        hub.publish(project_id, message)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_board_events(session: Session, previous_transaction):
+    session.info.pop("board_events", None)
@@ -1,84 +1,91 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+from fastapi import APIRouter, FastAPI, BackgroundTasks, Depends, File, HTTPException, Query, Request, UploadFile, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from . import crud, models, schemas
-from .database import SessionLocal, engine
-from fastapi.responses import FileResponse
-from .auth import get_current_user, oauth2_scheme, verify_password, create_access_token
+from .database import dispose_engines, get_async_db, get_async_engine, get_async_read_engine, get_db, get_engine, get_read_engine, new_async_session, new_session, pool_status
+from . import access
+from .access import project_access
+from .admission import AdmissionMiddleware, admission_control
+from .replica import StickyPrimaryMiddleware, get_async_read_db, get_read_db, sticky_primary
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from .auth import Principal, get_current_user, resolve_principal, oauth2_scheme, verify_password, create_access_token, principal_cache, hashing_stats
 from app.auth import verify_password, create_access_token
 from fastapi.security import OAuth2PasswordRequestForm
-from .crud import authenticate_user
+from . import async_crud, config, metrics, transfer
+from .events import hub
+from .audit import audit_writer
+from .snapshots import cached_response, cached_response_async, snapshot_cache
+from .fastjson import field_names, rows_response, rows_to_json
+from .pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 from sqlalchemy import exists, func
 
-models.Base.metadata.create_all(bind=engine)
+# Импорт модуля не трогает БД: схема создается и мигрируется командой
+# python -m app.manage migrate, движки открываются при первом запросе.
+router = APIRouter()
 
-app = FastAPI()
+# Самый длинный период аналитики в днях
+MAX_ANALYTICS_DAYS = 366
 
-# CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def next_cursor_headers(next_cursor: str) -> dict:
+    """Курсор следующей страницы передается в заголовке, тело остается списком."""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@app.post("/users/", response_model=schemas.UserResponse)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    return crud.create_user(db=db, user=user)
+@router.post("/users/", response_model=schemas.UserResponse)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.create_user(db=db, user=user)
 
-@app.post("/projects/", response_model=schemas.ProjectResponse)
+@router.post("/projects/", response_model=schemas.ProjectResponse)
 def create_project(
     project: schemas.ProjectCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     return crud.create_project(db=db, project=project, owner_id=current_user.id)
 
-@app.post("/projects/{project_id}/add-member/")
+@router.post("/projects/{project_id}/add-member/", dependencies=[Depends(access.project_owner)])
 def add_project_member(
     project_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     return crud.add_user_to_project(db=db, project_id=project_id, user_id=user_id)
 
 
-@app.post("/columns/{column_id}/tasks/", response_model=schemas.TaskResponse)
+@router.post("/columns/{column_id}/tasks/", response_model=schemas.TaskResponse, dependencies=[Depends(access.column_member)])
 def create_task(
         column_id: int,
         task: schemas.TaskCreate,
+        background_tasks: BackgroundTasks,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    column = db.query(models.Column).filter(
-        models.Column.id == column_id,
-        models.Column.is_active == True
-    ).first()
-    if not column:
-        raise HTTPException(status_code=404, detail="Колонка не найдена или неактивна")
-
-    db_task = models.Task(**task.dict(), column_id=column_id, author_id=current_user.id)
-    db.add(db_task)
-    db.commit()
-    db.refresh(db_task)
+    db_task = crud.create_task(db=db, task=task, column_id=column_id, author_id=current_user.id)
+    if crud.needs_rebalance(db_task):
+        background_tasks.add_task(rebalance_column, column_id)
     return db_task
 
 
-@app.post("/token", response_model=schemas.Token)
+@router.post("/batch", response_model=schemas.BatchResponse)
+def run_batch(
+        batch: schemas.BatchRequest,
+        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user)
+):
+    return {"results": crud.run_batch(db, batch.operations, current_user.id)}
+
+
+@router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),  # OAuth2PasswordRequestForm
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)  # form_data.username → email
+    user = await async_crud.authenticate_user(db, form_data.username, form_data.password)  # form_data.username → email
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -87,192 +94,354 @@ async def login_for_access_token(
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/")
+@router.get("/")
 def read_root():
     return {"message": "kanban"}
 
-@app.get("/favicon.ico", include_in_schema=False)
+@router.get("/internal/pool", include_in_schema=False)
+def pool_stats():
+    pools = {"sync": pool_status(get_engine()), "async": pool_status(get_async_engine())}
+    if config.READ_DATABASE_URL:
+        pools["read"] = pool_status(get_read_engine())
+        pools["read_async"] = pool_status(get_async_read_engine())
+        pools["read_routing"] = sticky_primary.stats()
+    return pools
+
+@router.get("/internal/cache", include_in_schema=False)
+def cache_stats():
+    return {"principal": principal_cache.stats(), "hashing": hashing_stats(), "events": hub.stats(),
+            "access": project_access.stats(),
+            "snapshots": snapshot_cache.stats(), "audit": audit_writer.stats(), "admission": admission_control.stats()}
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/favicon.ico", include_in_schema=False)
 async def favicon():
     return FileResponse("app/ico/kanbanicon.ico")
 
-@app.get("/users/", response_model=list[schemas.UserResponse])
-def get_users(db: Session = Depends(get_db)):
-    return crud.get_users(db)
+@router.get("/users/", response_model=list[schemas.UserResponse])
+def get_users(
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    users, next_cursor = crud.get_users(db, limit, cursor, columns=crud.USER_RESPONSE_COLUMNS)
+    return rows_response(users, crud.USER_RESPONSE_COLUMNS, next_cursor_headers(next_cursor))
 
 
-@app.post("/projects/{project_id}/columns/", response_model=schemas.ColumnResponse)
+@router.post("/projects/{project_id}/columns/", response_model=schemas.ColumnResponse, dependencies=[Depends(access.project_owner)])
 def create_column(
     project_id: int,
     column: schemas.ColumnCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     # Проверка активности проекта
-    project = db.query(models.Project).filter(
-        models.Project.id == project_id,
-        models.Project.is_active == True
-    ).first()
-    if not project:
+    if not crud.get_project(db, project_id):
         raise HTTPException(status_code=404, detail="Проект не найден или неактивен")
-    db_column = models.Column(**column.dict(), project_id=project_id)
-    db.add(db_column)
-    db.commit()
-    db.refresh(db_column)
     return crud.create_column(db=db, column=column, project_id=project_id)
 
 
-@app.delete("/projects/{project_id}")
-def deactivate_project(project_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@router.delete("/projects/{project_id}", dependencies=[Depends(access.project_owner)])
+def deactivate_project(project_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     result = crud.delete_project(db, project_id)
     return result
 
-@app.post("/projects/{project_id}/restore")
-def restore_project_route(project_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+@router.post("/projects/{project_id}/restore", dependencies=[Depends(access.project_owner)])
+def restore_project_route(project_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     result = crud.restore_project(db, project_id)
     return result
 
 
-@app.put("/projects/{project_id}", response_model=schemas.ProjectResponse)
+@router.put("/projects/{project_id}", response_model=schemas.ProjectResponse, dependencies=[Depends(access.project_owner)])
 def update_project(
         project_id: int,
-        project_update: schemas.ProjectCreate,
+        project_update: schemas.ProjectUpdate,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    db_project = crud.get_project(db, project_id)
-    if not db_project:
-        raise HTTPException(status_code=404, detail="Проект не найден")
-    if db_project.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    # Права, существование и версия проверяются в самом UPDATE (404/403/409)
+    return crud.update_project(db, project_id, project_update.name, current_user.id, project_update.version)
 
-    updated_project = crud.update_project(db, project_id, project_update.name)
-    return updated_project
 
-
-@app.put("/columns/{column_id}", response_model=schemas.ColumnResponse)
+@router.put("/columns/{column_id}", response_model=schemas.ColumnResponse, dependencies=[Depends(access.column_owner)])
 def update_column(
         column_id: int,
-        column_update: schemas.ColumnCreate,
+        column_update: schemas.ColumnUpdate,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    db_column = crud.get_column(db, column_id)
-    if not db_column:
-        raise HTTPException(status_code=404, detail="Колонка не найдена")
-    if db_column.project.owner_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
-
-    updated_column = crud.update_column(db, column_id, column_update.name, column_update.order)
-    return updated_column
+    return crud.update_column(db, column_id, column_update.name, column_update.order, column_update.version)
 
 
-@app.delete("/columns/{column_id}")
+@router.delete("/columns/{column_id}", dependencies=[Depends(access.column_owner)])
 def deactivate_column(column_id: int, db: Session = Depends(get_db)):
     result = crud.delete_column(db, column_id)
     return result
 
 
-@app.get("/tasks/{task_id}", response_model=schemas.TaskResponse)
-def read_task(task_id: int, db: Session = Depends(get_db)):
-    task = crud.get_task(db, task_id)
-    if not task:
+@router.get("/tasks/{task_id}", response_model=schemas.TaskResponse, dependencies=[Depends(access.task_member_replica)])
+def read_task(task_id: int, request: Request, db: Session = Depends(get_read_db)):
+    version = crud.get_task_version(db, task_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
-    return task
 
+    def build():
+        task = crud.get_task(db, task_id)
+        if not task:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        return schemas.TaskResponse.model_validate(task).model_dump_json().encode(), {}
 
-@app.put("/tasks/{task_id}", response_model=schemas.TaskResponse)
+    return cached_response(request, "task", (task_id,), version, build)
+
+
+@router.put("/tasks/{task_id}", response_model=schemas.TaskResponse, dependencies=[Depends(access.task_member)])
 def update_task(
         task_id: int,
-        task_update: schemas.TaskCreate,
+        task_update: schemas.TaskUpdate,
         db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+        current_user: Principal = Depends(get_current_user)
 ):
-    db_task = crud.get_task(db, task_id)
-    if not db_task:
-        raise HTTPException(status_code=404, detail="Задача не найдена")
-    if db_task.author_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
+    return crud.update_task(
+        db, task_id, task_update.title, task_update.description, task_update.priority, current_user.id,
+        task_update.version
+    )
+
+
+@router.post("/tasks/{task_id}/move", response_model=schemas.TaskResponse, dependencies=[Depends(access.task_member)])
+def move_task(
+        task_id: int,
+        move: schemas.TaskMove,
+        background_tasks: BackgroundTasks,
+        db: Session = Depends(get_db),
+        current_user: Principal = Depends(get_current_user)
+):
+    task = crud.move_task(db, task_id, move.column_id, current_user.id, move.after_task_id, move.before_task_id)
+    if crud.needs_rebalance(task):
+        background_tasks.add_task(rebalance_column, task.column_id)
+    return task
 
-    updated_task = crud.update_task(db, task_id, task_update.title, task_update.description, task_update.priority)
-    return updated_task
+def rebalance_column(column_id: int):
+    db = new_session()
+    try:
+        crud.rebalance_column(db, column_id)
+    finally:
+        db.close()
 
 
-@app.delete("/tasks/{task_id}")
-def deactivate_task(task_id: int, db: Session = Depends(get_db)):
-    result = crud.delete_task(db, task_id)
+@router.delete("/tasks/{task_id}", dependencies=[Depends(access.task_member)])
+def deactivate_task(task_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    result = crud.delete_task(db, task_id, current_user.id)
     return result
 
-    crud.delete_task(db, task_id)
-    return {"message": "Задача удалена"}
-@app.delete("/projects/{project_id}/remove-member/{user_id}")
+@router.delete("/projects/{project_id}/remove-member/{user_id}", dependencies=[Depends(access.project_owner)])
 def remove_member(
     project_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     return crud.remove_user_from_project(db, project_id, user_id)
-@app.get("/columns/{column_id}/tasks/", response_model=list[schemas.TaskResponse])
-def read_tasks_by_column(column_id: int, priority: int = None, db: Session = Depends(get_db)):
-    return crud.get_tasks_by_column(db, column_id, priority)
-@app.get("/projects/all", response_model=list[schemas.ProjectResponse])
+@router.get("/columns/{column_id}/tasks/", response_model=list[schemas.TaskResponse], dependencies=[Depends(access.column_member_replica_async)])
+async def read_tasks_by_column(
+    column_id: int,
+    request: Request,
+    priority: int = None,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    version = await async_crud.get_column_version(db, column_id)
+
+    async def build():
+        columns = crud.TASK_RESPONSE_COLUMNS
+        tasks, next_cursor = await async_crud.get_tasks_by_column(db, column_id, priority, limit, cursor, columns=columns)
+        return rows_to_json(tasks, field_names(columns)), next_cursor_headers(next_cursor)
+
+    return await cached_response_async(request, "column_tasks", (column_id, priority, limit, cursor), version, build)
+@router.get("/projects/{project_id}/board", response_model=schemas.BoardResponse, dependencies=[Depends(access.project_member_async)])
+async def read_board(project_id: int, priority: int = None, db: AsyncSession = Depends(get_async_db)):
+    board = await async_crud.get_board(db, project_id, priority)
+    if not board:
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    return board
+@router.get("/projects/{project_id}/tasks/search", response_model=list[schemas.TaskResponse], dependencies=[Depends(access.project_member_async)])
+async def search_tasks(
+    project_id: int,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    tasks = await async_crud.search_tasks(db, project_id, q, limit, columns=crud.TASK_RESPONSE_COLUMNS)
+    return rows_response(tasks, crud.TASK_RESPONSE_COLUMNS)
+@router.get("/projects/{project_id}/analytics/cfd", response_model=schemas.CfdResponse, dependencies=[Depends(access.project_member)])
+def read_cumulative_flow(
+    project_id: int,
+    days: int = Query(30, ge=1, le=MAX_ANALYTICS_DAYS),
+    until: date = None,
+    db: Session = Depends(get_db)
+):
+    return crud.get_cumulative_flow(db, project_id, days, until)
+@router.get("/projects/{project_id}/analytics/lead-time", response_model=schemas.LeadTimeResponse, dependencies=[Depends(access.project_member)])
+def read_lead_time(
+    project_id: int,
+    days: int = Query(30, ge=1, le=MAX_ANALYTICS_DAYS),
+    until: date = None,
+    db: Session = Depends(get_db)
+):
+    return crud.get_lead_time(db, project_id, days, until)
+@router.get("/projects/{project_id}/export", dependencies=[Depends(access.project_member)])
+def export_project(
+    project_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    if not crud.get_project(db, project_id):
+        raise HTTPException(status_code=404, detail="Проект не найден")
+    return StreamingResponse(
+        transfer.export_project(project_id, format),
+        media_type=transfer.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="project-{project_id}.{format}"'}
+    )
+@router.post("/projects/import", response_model=schemas.ProjectResponse)
+def import_project(
+    file: UploadFile = File(...),
+    format: str = Query(None, pattern="^(ndjson|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return transfer.import_project(db, file.file, transfer.format_for(file.filename, format), current_user.id)
+@router.get("/projects/all", response_model=list[schemas.ProjectResponse])
 def get_all_projects(
     is_active: bool = True,
-    db: Session = Depends(get_db)
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    projects, next_cursor = crud.get_projects(
+        db, current_user.id, is_active, limit, cursor, columns=crud.PROJECT_RESPONSE_COLUMNS
+    )
+    return rows_response(projects, crud.PROJECT_RESPONSE_COLUMNS, next_cursor_headers(next_cursor))
+@router.get("/tasks/{task_id}/logs/", response_model=list[schemas.TaskLogResponse], dependencies=[Depends(access.task_member_replica_async)])
+async def read_task_logs(
+    task_id: int,
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str = None,
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    return crud.get_projects(db, is_active)
-@app.get("/tasks/{task_id}/logs/", response_model=list[schemas.TaskLogResponse])
-def read_task_logs(task_id: int, db: Session = Depends(get_db)):
-    logs = crud.get_task_logs(db, task_id)
-    if not logs:
+    logs, next_cursor = await async_crud.get_task_logs(db, task_id, limit, cursor, columns=crud.TASK_LOG_RESPONSE_COLUMNS)
+    if not logs and cursor is None:
         raise HTTPException(status_code=404, detail="Логи не найдены")
-    return logs
+    return rows_response(logs, crud.TASK_LOG_RESPONSE_COLUMNS, next_cursor_headers(next_cursor))
 
-@app.post("/columns/{column_id}/restore")
+@router.post("/columns/{column_id}/restore", dependencies=[Depends(access.column_owner)])
 def restore_column_route(column_id: int, db: Session = Depends(get_db)):
     result = crud.restore_column(db, column_id)
     return result
 
-@app.post("/tasks/{task_id}/restore")
-def restore_task_route(task_id: int, db: Session = Depends(get_db)):
-    result = crud.restore_task(db, task_id)
+@router.post("/tasks/{task_id}/restore", dependencies=[Depends(access.task_member)])
+def restore_task_route(task_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    result = crud.restore_task(db, task_id, current_user.id)
     return result
 
 
-@app.get("/projects/me/", response_model=list[schemas.ProjectDetails])
-def read_user_projects(
-        db: Session = Depends(get_db),
-        current_user: models.User = Depends(get_current_user)
+@router.get("/projects/me/", response_model=list[schemas.ProjectDetails])
+async def read_user_projects(
+        request: Request,
+        db: AsyncSession = Depends(get_async_read_db),
+        current_user: Principal = Depends(get_current_user)
 ):
-    # Проекты, где пользователь - владелец
-    owned = db.query(models.Project).filter(
-        models.Project.owner_id == current_user.id,
-        models.Project.is_active == True
-    ).all()
-
-    # Проекты, где пользователь - участник
-    member = db.query(models.Project).join(models.ProjectMember).filter(
-        models.ProjectMember.user_id == current_user.id,
-        models.Project.is_active == True
-    ).all()
-
-    # Объедините списки и уберите дубликаты
-    projects = list(set(owned + member))
-
-    # Подсчет задач и формирование ответа
+    version = await async_crud.get_user_projects_version(db, current_user.id)
+
+    async def build():
+        return schemas.ProjectDetailsListAdapter.dump_json(await build_user_projects(db, current_user.id)), {}
+
+    return await cached_response_async(request, "user_projects", (current_user.id,), version, build)
+
+async def build_user_projects(db: AsyncSession, user_id: int):
+    # Проекты, где пользователь - владелец или участник (один запрос + пакетная загрузка участников)
+    projects = await async_crud.get_user_projects(db, user_id)
+
+    # Подсчет задач одним сгруппированным запросом
+    task_counts = await async_crud.get_active_task_counts(db, [project.id for project in projects])
+
     result = []
     for project in projects:
-        task_count = db.query(func.count(models.Task.id)).join(models.Column).filter(
-            models.Column.project_id == project.id,
-            models.Task.is_active == True  # Учет активности задач
-        ).scalar()
-
-        result.append({
-            "id": project.id,
-            "name": project.name,
-            "owner_id": project.owner_id,
-            "task_count": task_count,
-            "members": [schemas.ProjectMemberResponse(**u.__dict__) for u in project.members]
-        })
-
-    return result
\ No newline at end of file
+        result.append(schemas.ProjectDetails(
+            id=project.id,
+            name=project.name,
+            owner_id=project.owner_id,
+            version=project.version,
+            task_count=task_counts.get(project.id, 0),
+            members=[schemas.ProjectMemberResponse(**u.__dict__) for u in project.members]
+        ))
+
+    return result
+
+
+@router.websocket("/projects/{project_id}/events")
+async def project_events(websocket: WebSocket, project_id: int, token: str):
+    """Поток изменений доски: task.*/column.* события и resync после переполнения очереди."""
+    # Сессия нужна только для проверки токена и не держит соединение из пула
+    async with new_async_session() as db:
+        principal = await resolve_principal(token, db)
+    if principal is None or project_id not in await run_in_threadpool(project_access.roles, principal.id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscriber = hub.subscribe(project_id)
+    # Клиент ничего не присылает, но сокет читаем: иначе его отключение не увидеть
+    # до следующего события, и подписчик с обработчиком висели бы до остановки
+    receiver = asyncio.ensure_future(websocket.receive())
+    getter = asyncio.ensure_future(subscriber.queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait((getter, receiver), return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter in done:
+                await websocket.send_json(getter.result())
+                getter = asyncio.ensure_future(subscriber.queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        getter.cancel()
+        hub.unsubscribe(subscriber)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Все накопленные события аудита записываются до остановки воркера
+    audit_writer.stop()
+    await dispose_engines()
+
+def create_app() -> FastAPI:
+    application = FastAPI(lifespan=lifespan)
+    # add_middleware оборачивает снаружи: порядок добавления - от приложения наружу
+    if config.READ_DATABASE_URL:
+        application.add_middleware(StickyPrimaryMiddleware)
+    # Внутри CORS, чтобы отказы 429/503 тоже получали CORS-заголовки
+    application.add_middleware(AdmissionMiddleware)
+    # CORS
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[NEXT_CURSOR_HEADER],
+    )
+    # Последним, т.е. снаружи CORS: время ответа включает все middleware
+    application.add_middleware(metrics.MetricsMiddleware)
+    application.include_router(router)
+    return application
+
+app = create_app()
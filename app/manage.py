@@ -0,0 +1,95 @@
+import argparse
+from . import migrations
+from .database import get_engine, new_session
+
+# Служебные команды, которые раньше выполнялись при импорте приложения или
+# из __main__ отдельных модулей:
+#   python -m app.manage migrate
+#   python -m app.manage rebuild-counters
+#   python -m app.manage rebuild-search
+#   python -m app.manage purge-logs --days 180
+#   python -m app.manage archive --days 90
+#   python -m app.manage backfill-analytics
+#   python -m app.manage sync-replica
+
+
+def migrate(args):
+    migrations.upgrade(get_engine())
+    print("Схема БД обновлена")
+
+def rebuild_counters(args):
+    from .crud import rebuild_task_counters
+    db = new_session()
+    try:
+        rebuild_task_counters(db)
+    finally:
+        db.close()
+    print("Счетчики задач пересчитаны")
+
+def rebuild_search(args):
+    from .search import rebuild_index
+    with get_engine().begin() as conn:
+        rebuild_index(conn, args.chunk_size)
+    print("Поисковый индекс перестроен")
+
+def purge_logs(args):
+    from .audit import purge_task_logs
+    print(f"Удалено записей: {purge_task_logs(args.days, args.chunk_size)}")
+
+def archive(args):
+    from .archive import archive_inactive
+    archived = archive_inactive(args.days, args.chunk_size)
+    print(f"В архив перенесено задач: {archived['tasks']}, колонок: {archived['columns']}")
+
+def backfill_analytics(args):
+    from .analytics import backfill
+    result = backfill(get_engine(), args.chunk_size)
+    print(f"Добавлено переходов: {result['transitions']}, пересчитано проектов: {result['projects']}")
+
+def sync_replica(args):
+    # Для локальной проверки чтений с реплики: копия SQLite-файла основной базы
+    import sqlite3
+    from sqlalchemy.engine import make_url
+    from .database import DATABASE_URL, READ_DATABASE_URL
+    source, target = make_url(DATABASE_URL), make_url(READ_DATABASE_URL or "sqlite://")
+    if any(url.get_backend_name() != "sqlite" or not url.database for url in (source, target)):
+        raise SystemExit("sync-replica копирует только файловые SQLite-базы: задайте DATABASE_URL и READ_DATABASE_URL")
+    primary, replica = sqlite3.connect(source.database), sqlite3.connect(target.database)
+    try:
+        primary.backup(replica)
+    finally:
+        primary.close()
+        replica.close()
+    print(f"Реплика {target.database} обновлена")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.manage", description="Управление базой kanban")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="создать таблицы и применить миграции").set_defaults(handler=migrate)
+    commands.add_parser("rebuild-counters", help="пересчитать счетчики активных задач").set_defaults(
+        handler=rebuild_counters
+    )
+    search = commands.add_parser("rebuild-search", help="перестроить поисковый индекс задач")
+    search.add_argument("--chunk-size", type=int, default=1000)
+    search.set_defaults(handler=rebuild_search)
+    purge = commands.add_parser("purge-logs", help="удалить старые записи task_logs")
+    purge.add_argument("--days", type=int, default=180)
+    purge.add_argument("--chunk-size", type=int, default=1000)
+    purge.set_defaults(handler=purge_logs)
+    archiving = commands.add_parser("archive", help="перенести давно неактивные задачи и колонки в архив")
+    archiving.add_argument("--days", type=int, default=90)
+    archiving.add_argument("--chunk-size", type=int, default=1000)
+    archiving.set_defaults(handler=archive)
+    analytics = commands.add_parser("backfill-analytics", help="построить аналитику потока для существующих данных")
+    analytics.add_argument("--chunk-size", type=int, default=1000)
+    analytics.set_defaults(handler=backfill_analytics)
+    commands.add_parser("sync-replica", help="скопировать SQLite-базу в READ_DATABASE_URL").set_defaults(
+        handler=sync_replica
+    )
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import config
+
+# Метрики запросов в формате Prometheus (GET /metrics), по шаблону маршрута.
+# На каждый HTTP-запрос заводится RequestStats в контекстной переменной; хуки
+# движка (на класс Engine, т.е. для sync и async движков) добавляют в него число
+# и время SQL-запросов, auth - время bcrypt. Время приложения - остаток:
+# валидация, сериализация и прочий Python.
+
+# Столько одинаковых по форме запросов за один HTTP-запрос считается N+1
+N_PLUS_ONE_THRESHOLD = 5
+# Сколько запросов и символов каждого попадает в журнал медленных запросов
+SLOW_LOG_MAX_STATEMENTS = 50
+SLOW_LOG_MAX_SQL_LENGTH = 500
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+logger = logging.getLogger(__name__)
+slow_logger = logging.getLogger("app.metrics.slow")
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Счетчики по корзинам (последняя - +Inf), сумма
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values: tuple, amount: int = 1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{{{_labels(self.labels, key)}}} {value}" for key, value in values)
+        return lines
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"') for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+ROUTE_LABELS = ("method", "route")
+requests_total = CounterMetric("kanban_http_requests_total", "HTTP-запросы", ROUTE_LABELS + ("status",))
+request_seconds = Histogram("kanban_http_request_duration_seconds", "Время ответа", TIME_BUCKETS, ROUTE_LABELS)
+db_seconds = Histogram("kanban_db_time_seconds", "Суммарное время SQL за запрос", TIME_BUCKETS, ROUTE_LABELS)
+db_statements = Histogram("kanban_db_statements", "Число SQL-запросов за запрос", COUNT_BUCKETS, ROUTE_LABELS)
+db_slowest_seconds = Histogram(
+    "kanban_db_slowest_statement_seconds", "Самый медленный SQL-запрос за запрос", TIME_BUCKETS, ROUTE_LABELS
+)
+hashing_seconds = Histogram("kanban_hashing_seconds", "Время bcrypt за запрос", TIME_BUCKETS, ROUTE_LABELS)
+app_seconds = Histogram(
+    "kanban_app_time_seconds", "Время вне БД и bcrypt (валидация, сериализация)", TIME_BUCKETS, ROUTE_LABELS
+)
+repeated_statements_total = CounterMetric(
+    "kanban_db_repeated_statements_total", "Запросы с повторяющимися SQL одной формы (N+1)", ROUTE_LABELS
+)
+# Все SQL-запросы, в т.ч. вне HTTP-запросов, по движку: primary, primary_async, replica, replica_async
+engine_statements_total = CounterMetric("kanban_db_engine_statements_total", "SQL-запросы по движкам", ("engine",))
+# Запросы, отклоненные допуском (admission.py): rate_limited, key_concurrency, overloaded
+admission_rejected_total = CounterMetric("kanban_admission_rejected_total", "Отклоненные допуском запросы", ("reason",))
+METRICS = [requests_total, request_seconds, db_seconds, db_statements, db_slowest_seconds,
+           hashing_seconds, app_seconds, repeated_statements_total, engine_statements_total, admission_rejected_total]
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "slowest", "slowest_sql", "hashing_time", "shapes", "captured")
+
+    def __init__(self, capture: bool):
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.hashing_time = 0.0
+        # Текст SQL с параметрами-заполнителями: одинаковый для одной формы запроса
+        self.shapes = Counter()
+        self.captured = [] if capture else None
+
+    def record_statement(self, statement: str, elapsed: float):
+        self.statements += 1
+        self.db_time += elapsed
+        self.shapes[statement] += 1
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_sql = statement
+        if self.captured is not None and len(self.captured) < SLOW_LOG_MAX_STATEMENTS:
+            self.captured.append((statement[:SLOW_LOG_MAX_SQL_LENGTH], elapsed))
+
+
+current_request: ContextVar = ContextVar("current_request", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _statement_started(conn, cursor, statement, parameters, context, executemany):
+    if current_request.get() is not None:
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _statement_finished(conn, cursor, statement, parameters, context, executemany):
+    engine_statements_total.inc((conn.engine.logging_name or "default",))
+    stats = current_request.get()
+    if stats is not None and conn.info.get("statement_started"):
+        stats.record_statement(statement, time.perf_counter() - conn.info["statement_started"].pop())
+
+@event.listens_for(Engine, "handle_error")
+def _statement_failed(context):
+    started = context.connection.info.get("statement_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+def record_hashing(elapsed: float):
+    stats = current_request.get()
+    if stats is not None:
+        stats.hashing_time += elapsed
+
+
+class MetricsMiddleware:
+    """ASGI middleware: собирает RequestStats и пишет метрики после ответа."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        sample_rate = config.SLOW_REQUEST_SAMPLE_RATE
+        stats = RequestStats(capture=sample_rate > 0 and random.random() < sample_rate)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        response = {"status": 500, "finished": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body"):
+                response["finished"] = time.perf_counter()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            # Фоновые задачи ответа выполняются после отправки тела: их SQL
+            # попадает в статистику, но не во время ответа
+            elapsed = (response["finished"] or time.perf_counter()) - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            observe(scope["method"], route, response["status"], elapsed, stats)
+
+
+def observe(method: str, route: str, status_code: int, elapsed: float, stats: RequestStats):
+    key = (method, route)
+    requests_total.inc(key + (status_code,))
+    request_seconds.observe(key, elapsed)
+    db_seconds.observe(key, stats.db_time)
+    db_statements.observe(key, stats.statements)
+    db_slowest_seconds.observe(key, stats.slowest)
+    hashing_seconds.observe(key, stats.hashing_time)
+    app_seconds.observe(key, max(0.0, elapsed - stats.db_time - stats.hashing_time))
+    repeated = {sql: count for sql, count in stats.shapes.items() if count >= N_PLUS_ONE_THRESHOLD}
+    if repeated:
+        repeated_statements_total.inc(key)
+        sql, count = max(repeated.items(), key=lambda item: item[1])
+        logger.warning("Возможный N+1 в %s %s: %s одинаковых запросов: %s", method, route, count,
+                       sql[:SLOW_LOG_MAX_SQL_LENGTH])
+    if stats.captured is not None and elapsed * 1000 >= config.SLOW_REQUEST_MS:
+        slow_logger.warning(
+            "Медленный запрос %s %s: %.1f мс, SQL %s шт. / %.1f мс (самый долгий %.1f мс), bcrypt %.1f мс\n%s",
+            method, route, elapsed * 1000, stats.statements, stats.db_time * 1000, stats.slowest * 1000,
+            stats.hashing_time * 1000,
+            "\n".join(f"  {duration * 1000:8.2f} мс  {sql}" for sql, duration in stats.captured),
+        )
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
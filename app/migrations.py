@@ -0,0 +1,106 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, update
+from sqlalchemy.engine import Connection, Engine
+from . import models
+
+# Версионированные миграции для баз, созданных до появления новых колонок и индексов.
+# Каждая миграция идемпотентна: на свежей базе после create_all она ничего не делает.
+
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255)),
+    Column("applied_at", DateTime, default=models.utcnow),
+)
+
+
+def _add_task_rank(conn: Connection):
+    _add_column(conn, models.Task, "rank", "NOT NULL DEFAULT ''")
+    _create_indexes(conn, ["ix_tasks_column_rank"])
+
+def _add_query_indexes(conn: Connection):
+    _create_indexes(conn, [
+        "ix_tasks_column_active_priority",
+        "ix_tasks_active_column_rank",
+        "ix_columns_project_active",
+        "ix_projects_owner_active",
+        "ix_project_members_user",
+        "ix_task_logs_task_created",
+    ])
+
+def _add_column(conn: Connection, model, name: str, constraints: str = "NULL"):
+    table = model.__table__
+    if name in {c["name"] for c in inspect(conn).get_columns(table.name)}:
+        return
+    quoted = conn.dialect.identifier_preparer.quote(name)
+    column_type = table.c[name].type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD {quoted} {column_type} {constraints}")
+
+def _create_indexes(conn: Connection, names: list[str]):
+    indexes = {index.name: index for table in models.Base.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+def _build_search_index(conn: Connection):
+    from .search import rebuild_index
+    rebuild_index(conn)
+
+def _add_soft_delete_cascade(conn: Connection):
+    for model in (models.Project, models.Column, models.Task):
+        _add_column(conn, model, "deactivated_at")
+    _create_indexes(conn, ["ix_columns_inactive_deactivated", "ix_tasks_inactive_deactivated"])
+    # Уже удаленные строки: отсчет срока архивации начинается с миграции
+    stamp = models.utcnow()
+    for model in (models.Project, models.Column, models.Task):
+        conn.execute(update(model).where(model.is_active == False, model.deactivated_at.is_(None)).values(
+            deactivated_at=stamp
+        ))
+    # До каскада колонки и задачи удаленных родителей оставались активными
+    Project, ColumnModel, Task = models.Project, models.Column, models.Task
+    conn.execute(update(ColumnModel).where(
+        ColumnModel.is_active == True,
+        ColumnModel.project_id.in_(select(Project.id).where(Project.is_active == False))
+    ).values(is_active=False, deactivated_at=stamp))
+    conn.execute(update(Task).where(
+        Task.is_active == True,
+        Task.column_id.in_(select(ColumnModel.id).where(ColumnModel.is_active == False))
+    ).values(is_active=False, deactivated_at=stamp))
+    counter = models.ColumnTaskCounter
+    conn.execute(update(counter).values(active_tasks=select(func.count(Task.id)).where(
+        Task.column_id == counter.column_id, Task.is_active == True
+    ).scalar_subquery()))
+
+
+def _add_row_versions(conn: Connection):
+    for model in (models.Project, models.Column, models.Task):
+        _add_column(conn, model, "version", "NOT NULL DEFAULT 1")
+
+def _fill_task_counters(conn: Connection):
+    # Без строк счетчиков /projects/me/ показывал бы 0 задач, а счетчик, созданный
+    # первой записью в колонку, - число только для этой колонки
+    from .crud import rebuild_task_counter_rows
+    rebuild_task_counter_rows(conn)
+
+MIGRATIONS = [
+    (1, "tasks.rank", _add_task_rank),
+    (2, "query indexes", _add_query_indexes),
+    (3, "task search index", _build_search_index),
+    (4, "soft delete cascade", _add_soft_delete_cascade),
+    (5, "row versions", _add_row_versions),
+    (6, "column task counters", _fill_task_counters),
+]
+
+
+def upgrade(engine: Engine):
+    """Создает недостающие таблицы и применяет еще не примененные миграции, каждую в своей транзакции."""
+    models.Base.metadata.create_all(bind=engine)
+    migration_metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = set(conn.scalars(select(schema_migrations.c.version)))
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name))
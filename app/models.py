@@ -1,7 +1,17 @@
+from datetime import datetime, timezone
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, String, Integer, Boolean, Text, DateTime, func
+from sqlalchemy import BigInteger, ForeignKey, Index, String, Integer, Boolean, Text, Date, DateTime, func, text
 from .database import Base
 
+
+def utcnow() -> datetime:
+    """Текущее время в UTC без tzinfo; все отметки времени в БД пишутся по этим часам.
+
+    Колонки DateTime - без часового пояса, а CURRENT_TIMESTAMP в SQLite тоже UTC,
+    поэтому локальные часы приложения (datetime.now()) с ними смешивать нельзя.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(Base):
     __tablename__ = "users"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
@@ -10,48 +20,165 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     projects: Mapped[list["Project"]] = relationship(secondary="project_members", back_populates="members")
 
+# Условие для фильтрованных индексов: в горячих запросах участвуют только активные строки
+ACTIVE_ONLY = text("is_active = 1")
+# А задание архивации (archive.py) ищет только неактивные
+INACTIVE_ONLY = text("is_active = 0")
+
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_owner_active", "owner_id", "is_active"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255))
     owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
+    deactivated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")  # Номер правки (см. crud._update_versioned)
     members: Mapped[list["User"]] = relationship(secondary="project_members", back_populates="projects")
-    columns: Mapped[list["Column"]] = relationship(back_populates="project")
+    columns: Mapped[list["Column"]] = relationship(back_populates="project", order_by="Column.order")
 
 class ProjectMember(Base):
     __tablename__ = "project_members"
+    __table_args__ = (Index("ix_project_members_user", "user_id"),)  # PK начинается с project_id
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
 
 class Column(Base):
     __tablename__ = "columns"
+    __table_args__ = (
+        Index("ix_columns_project_active", "project_id", "is_active"),
+        Index("ix_columns_inactive_deactivated", "deactivated_at", mssql_where=INACTIVE_ONLY, sqlite_where=INACTIVE_ONLY),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(255))
     order: Mapped[int] = mapped_column(Integer, default=0)
     project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)  # Добавлено
+    # Момент деактивации; у строк, деактивированных каскадом, совпадает с родительским
+    deactivated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")  # Номер правки (см. crud._update_versioned)
     project: Mapped["Project"] = relationship(back_populates="columns")
-    tasks: Mapped[list["Task"]] = relationship(back_populates="column")
+    tasks: Mapped[list["Task"]] = relationship(back_populates="column", order_by="[Task.rank, Task.id]")
 
 class Task(Base):
     __tablename__ = "tasks"
+    __mapper_args__ = {"eager_defaults": True}  # created_at приходит из INSERT, без отдельного SELECT
+    __table_args__ = (
+        Index("ix_tasks_column_rank", "column_id", "rank"),
+        Index("ix_tasks_column_active_priority", "column_id", "is_active", "priority"),
+        Index("ix_tasks_active_column_rank", "column_id", "rank", mssql_where=ACTIVE_ONLY, sqlite_where=ACTIVE_ONLY),
+        Index("ix_tasks_inactive_deactivated", "deactivated_at", mssql_where=INACTIVE_ONLY, sqlite_where=INACTIVE_ONLY),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(255))
     description: Mapped[str] = mapped_column(Text, nullable=True)
     column_id: Mapped[int] = mapped_column(ForeignKey("columns.id"))
     author_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     priority: Mapped[int] = mapped_column(Integer, default=2)
-    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    rank: Mapped[str] = mapped_column(String(64), default="", server_default="")  # Позиция в колонке (см. ranking.py)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=utcnow, server_default=func.now())
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)  # Добавлено
+    deactivated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    version: Mapped[int] = mapped_column(Integer, default=1, server_default="1")  # Номер правки (см. crud._update_versioned)
     column: Mapped["Column"] = relationship(back_populates="tasks")
     logs: Mapped[list["TaskLog"]] = relationship(back_populates="task")
 
 class TaskLog(Base):
     __tablename__ = "task_logs"
+    __table_args__ = (Index("ix_task_logs_task_created", "task_id", "created_at"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id"))
     message: Mapped[str] = mapped_column(Text)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
-    task: Mapped["Task"] = relationship(back_populates="logs")
\ No newline at end of file
+    created_at: Mapped[DateTime] = mapped_column(DateTime, default=utcnow, server_default=func.now())
+    task: Mapped["Task"] = relationship(back_populates="logs")
+
+class ColumnTaskCounter(Base):
+    """Счетчик активных задач колонки; обновляется в той же транзакции, что и сами задачи."""
+    __tablename__ = "column_task_counters"
+    column_id: Mapped[int] = mapped_column(ForeignKey("columns.id"), primary_key=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    active_tasks: Mapped[int] = mapped_column(Integer, default=0)
+
+class ProjectVersion(Base):
+    """Версия содержимого проекта; увеличивается при каждом изменении его доски (см. snapshots.py)."""
+    __tablename__ = "project_versions"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+class TaskSearchTerm(Base):
+    """Инвертированный индекс поиска задач: термин -> задача в пределах проекта (см. search.py)."""
+    __tablename__ = "task_search_terms"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
+    term: Mapped[str] = mapped_column(String(64), primary_key=True)
+    task_id: Mapped[int] = mapped_column(ForeignKey("tasks.id"), primary_key=True, index=True)
+
+
+# Аналитика потока (см. analytics.py): события переходов задач между колонками и
+# дневные агрегаты, которые обновляются в той же транзакции, что и задачи.
+
+class TaskTransition(Base):
+    """Переход задачи: created/restored (из None), moved, deleted (в None)."""
+    __tablename__ = "task_transitions"
+    __table_args__ = (Index("ix_task_transitions_project_time", "project_id", "occurred_at", "id"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # Без внешнего ключа на tasks: история переживает архивацию задач
+    task_id: Mapped[int] = mapped_column(Integer, index=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
+    kind: Mapped[str] = mapped_column(String(16))
+    from_column_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    to_column_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    occurred_at: Mapped[DateTime] = mapped_column(DateTime)
+
+class ColumnDailyFlow(Base):
+    """Поступления и уходы задач колонки за день и число задач в ней на конец дня (для CFD)."""
+    __tablename__ = "column_daily_flow"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
+    column_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    arrivals: Mapped[int] = mapped_column(Integer, default=0)
+    departures: Mapped[int] = mapped_column(Integer, default=0)
+    wip: Mapped[int] = mapped_column(Integer, default=0)
+
+class ProjectDailyLeadTime(Base):
+    """Завершенные за день задачи проекта и суммы их lead time и cycle time в секундах."""
+    __tablename__ = "project_daily_lead_time"
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), primary_key=True)
+    day: Mapped[Date] = mapped_column(Date, primary_key=True)
+    completed: Mapped[int] = mapped_column(Integer, default=0)
+    lead_seconds: Mapped[int] = mapped_column(BigInteger, default=0)
+    cycle_completed: Mapped[int] = mapped_column(Integer, default=0)
+    cycle_seconds: Mapped[int] = mapped_column(BigInteger, default=0)
+
+# Архив: неактивные дольше ARCHIVE_AFTER_DAYS строки переносятся сюда из горячих
+# таблиц (см. archive.py). Без внешних ключей - архив не мешает удалять пользователей и проекты.
+
+class ArchivedColumn(Base):
+    __tablename__ = "archived_columns"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    name: Mapped[str] = mapped_column(String(255))
+    order: Mapped[int] = mapped_column(Integer)
+    project_id: Mapped[int] = mapped_column(Integer, index=True)
+    deactivated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[DateTime] = mapped_column(DateTime)
+
+class ArchivedTask(Base):
+    __tablename__ = "archived_tasks"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(255))
+    description: Mapped[str] = mapped_column(Text, nullable=True)
+    column_id: Mapped[int] = mapped_column(Integer, index=True)
+    author_id: Mapped[int] = mapped_column(Integer)
+    priority: Mapped[int] = mapped_column(Integer)
+    rank: Mapped[str] = mapped_column(String(64))
+    created_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    deactivated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[DateTime] = mapped_column(DateTime)
+
+class ArchivedTaskLog(Base):
+    __tablename__ = "archived_task_logs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    task_id: Mapped[int] = mapped_column(Integer, index=True)
+    message: Mapped[str] = mapped_column(Text)
+    user_id: Mapped[int] = mapped_column(Integer)
+    created_at: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, String, and_, or_
+
+# Максимальный размер страницы, который можно запросить через limit
+MAX_PAGE_SIZE = 500
+# Жесткий предел для запросов без limit (старое поведение "вернуть все")
+UNPAGINATED_LIMIT = 5000
+# Заголовок, в котором отдается курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: list) -> str:
+    """Упаковывает значения ключа последней строки в непрозрачный курсор."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, keys: list) -> list:
+    """Распаковывает курсор обратно в значения ключа; при ошибке - 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError
+        return [_key_value(key, v) for key, v in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+def _key_value(key, value):
+    """Значение из курсора, проверенное по типу колонки ключа: курсор присылает клиент."""
+    if isinstance(key.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(key.type, Integer) and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(key.type, String) and isinstance(value, str):
+        return value
+    raise ValueError
+
+def keyset_filter(keys: list, values: list):
+    """(a, b) > (x, y) без сравнения кортежей, которого нет в SQL Server."""
+    clauses = []
+    for i, key in enumerate(keys):
+        equal = [keys[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, key > values[i]))
+    return or_(*clauses)
+
+def _page_query(query, keys: list, limit: int, cursor: str):
+    """Запрос (Query или select) на одну строку больше страницы, после курсора."""
+    query = query.order_by(*keys)
+    if cursor:
+        query = query.filter(keyset_filter(keys, decode_cursor(cursor, keys)))
+    return query.limit(limit + 1)
+
+def _split_page(rows: list, keys: list, limit: int):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, key.key) for key in keys])
+
+def paginate(query, keys: list, limit: int = None, cursor: str = None):
+    """Keyset-пагинация: возвращает (строки, курсор следующей страницы или None)."""
+    if limit is None:
+        limit = UNPAGINATED_LIMIT
+    return _split_page(_page_query(query, keys, limit, cursor).all(), keys, limit)
+
+async def paginate_async(db, statement, keys: list, limit: int = None, cursor: str = None):
+    """paginate() для select на AsyncSession."""
+    if limit is None:
+        limit = UNPAGINATED_LIMIT
+    result = await db.execute(_page_query(statement, keys, limit, cursor))
+    return _split_page(result.all(), keys, limit)
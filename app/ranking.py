@@ -0,0 +1,66 @@
+# Дробные (лексикографические) ранги задач внутри колонки.
+# Только цифры и строчные буквы: порядок совпадает и в регистронезависимых
+# сортировках SQL Server. Ранг никогда не заканчивается на "0", поэтому
+# между любыми двумя рангами всегда есть место.
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+# Длина ранга, после которой колонку пора перенумеровать
+REBALANCE_RANK_LENGTH = 24
+
+
+def rank_between(before: str = None, after: str = None) -> str:
+    """Ранг строго между before и after; None означает начало/конец колонки."""
+    before = before or ""
+    if after is not None and after <= before:
+        raise ValueError("after должен быть больше before")
+    result = ""
+    i = 0
+    while True:
+        low = DIGITS.index(before[i]) if i < len(before) else 0
+        high = DIGITS.index(after[i]) if after is not None and i < len(after) else BASE
+        if low == high:
+            result += DIGITS[low]
+        else:
+            mid = (low + high) // 2
+            if mid > low:
+                return result + DIGITS[mid]
+            # Соседние цифры: берем нижнюю, дальше верхней границы уже нет
+            result += DIGITS[low]
+            after = None
+        i += 1
+
+def rank_after(before: str = None) -> str:
+    """Ранг в конец колонки после before; длина растет логарифмически от числа задач."""
+    # rank_between(before, None) удлинял бы ранг на символ каждые несколько вставок:
+    # здесь ранг увеличивается на единицу, а когда разряды исчерпаны ("z...z"),
+    # дописывается столько же новых
+    if not before:
+        return DIGITS[BASE // 2]
+    digits = [DIGITS.index(c) for c in before]
+    i = len(digits) - 1
+    while i >= 0 and digits[i] == BASE - 1:
+        digits[i] = 0
+        i -= 1
+    if i < 0:
+        return before + "0" * (len(before) - 1) + "1"
+    digits[i] += 1
+    if digits[-1] == 0:
+        digits[-1] = 1
+    return "".join(DIGITS[d] for d in digits)
+
+def evenly_spaced_ranks(count: int) -> list[str]:
+    """Равномерные ранги одинаковой длины для перенумерации колонки."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    step = BASE ** width // (count + 1)
+    ranks = []
+    for position in range(1, count + 1):
+        value = position * step
+        digits = ""
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits = DIGITS[digit] + digits
+        ranks.append(digits + "i")
+    return ranks
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import config
+from .database import get_async_db, new_async_read_session, new_read_session, new_session
+
+# Чтения GET-обработчиков идут на реплику (READ_DATABASE_URL), записи - на
+# основную базу. Реплика отстает, поэтому клиент, который только что писал,
+# READ_STICKY_SECONDS читает с основной: свои изменения он видит сразу.
+# Клиент узнается по cookie (переживает переход на другой воркер) или, для
+# API-клиентов без cookie, по заголовку Authorization в памяти воркера.
+
+STICKY_COOKIE = "kanban_primary_until"
+STICKY_MAX_CLIENTS = 10000
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class StickyPrimary:
+    """Клиент -> момент, до которого его чтения идут на основную базу (LRU)."""
+
+    def __init__(self, maxsize: int = STICKY_MAX_CLIENTS):
+        self.maxsize = maxsize
+        self._until = OrderedDict()
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    def mark(self, key: str, until: float):
+        with self._lock:
+            self._until[key] = until
+            self._until.move_to_end(key)
+            if len(self._until) > self.maxsize:
+                self._until.popitem(last=False)
+
+    def record_read(self, primary: bool):
+        with self._lock:
+            if primary:
+                self.primary_reads += 1
+            else:
+                self.replica_reads += 1
+
+    def is_sticky(self, key: str) -> bool:
+        with self._lock:
+            until = self._until.get(key)
+        return until is not None and until > time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            clients = len(self._until)
+        return {"clients": clients, "primary_reads": self.primary_reads, "replica_reads": self.replica_reads}
+
+
+sticky_primary = StickyPrimary()
+
+
+def _reads_from_primary(request: Request) -> bool:
+    until = request.cookies.get(STICKY_COOKIE)
+    try:
+        if until and float(until) > time.time():
+            return True
+    except ValueError:
+        pass
+    authorization = request.headers.get("authorization")
+    return authorization is not None and sticky_primary.is_sticky(authorization)
+
+def _read_from_primary(request: Request) -> bool:
+    if config.READ_DATABASE_URL is None:
+        return True
+    primary = _reads_from_primary(request)
+    sticky_primary.record_read(primary)
+    return primary
+
+def get_read_db(request: Request):
+    """Сессия для чтения: реплика, если клиент недавно не писал."""
+    db = new_session() if _read_from_primary(request) else new_read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request, primary_db: AsyncSession = Depends(get_async_db)):
+    """get_read_db для async def обработчиков.
+
+    С основной базы читает та же сессия get_async_db, что у get_current_user: на
+    промахе кэша она уже держит соединение, и вторая сессия из того же пула при
+    нагрузке ждала бы соединения, которые держат такие же запросы.
+    """
+    if _read_from_primary(request):
+        yield primary_db
+        return
+    async with new_async_read_session() as db:
+        yield db
+
+
+class StickyPrimaryMiddleware:
+    """ASGI middleware: после успешного изменяющего запроса открывает окно чтения с основной базы."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                window = config.READ_STICKY_SECONDS
+                until = time.time() + window
+                for name, value in scope["headers"]:
+                    if name == b"authorization":
+                        sticky_primary.mark(value.decode("latin-1"), until)
+                cookie = f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(window) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional
+from pydantic import BaseModel, TypeAdapter
+from datetime import date, datetime
+from typing import Any, List, Literal, Optional
 
 class UserCreate(BaseModel):
     email: str
@@ -15,9 +15,13 @@ class UserResponse(BaseModel):
 class ProjectCreate(BaseModel):
     name: str
 
+class ProjectUpdate(ProjectCreate):
+    version: Optional[int] = None  # Версия, которую видел клиент; без нее правка без проверки
+
 class ProjectResponse(ProjectCreate):
     id: int
     owner_id: int
+    version: int
     class Config:
         from_attributes = True
 
@@ -32,9 +36,18 @@ class TaskResponse(TaskCreate):
     column_id: int
     created_at: datetime
     is_active: bool  # Добавлено
+    version: int
     class Config:
         from_attributes = True
 
+class TaskUpdate(TaskCreate):
+    version: Optional[int] = None
+
+class TaskMove(BaseModel):
+    column_id: int
+    after_task_id: Optional[int] = None  # Задача, которая окажется выше перемещаемой
+    before_task_id: Optional[int] = None  # Задача, которая окажется ниже перемещаемой
+
 class TaskLogResponse(BaseModel):
     message: str
     created_at: datetime
@@ -57,10 +70,14 @@ class ColumnCreate(BaseModel):
     name: str
     order: Optional[int] = 0
 
+class ColumnUpdate(ColumnCreate):
+    version: Optional[int] = None
+
 class ColumnResponse(ColumnCreate):
     id: int
     project_id: int
     is_active: bool  # Добавлено
+    version: int
     class Config:
         from_attributes = True
 class ProjectMemberResponse(BaseModel):
@@ -75,3 +92,60 @@ class ProjectDetails(ProjectResponse):
     class Config:
         from_attributes = True
 
+
+class BoardColumn(ColumnResponse):
+    tasks: List[TaskResponse] = []
+    class Config:
+        from_attributes = True
+
+class BoardResponse(ProjectResponse):
+    columns: List[BoardColumn] = []
+    class Config:
+        from_attributes = True
+
+class BatchOperation(BaseModel):
+    op: Literal[
+        "create_task", "update_task", "move_task", "delete_task", "restore_task",
+        "delete_column", "restore_column", "add_member", "remove_member"
+    ]
+    task_id: Optional[int] = None
+    column_id: Optional[int] = None
+    project_id: Optional[int] = None
+    user_id: Optional[int] = None
+    task: Optional[TaskCreate] = None
+    version: Optional[int] = None  # Для update_task: как в PUT /tasks/{id}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+
+class BatchResponse(BaseModel):
+    results: List[Any]
+
+class CfdSeries(BaseModel):
+    column_id: int
+    name: str
+    values: List[int]
+
+class CfdResponse(BaseModel):
+    project_id: int
+    dates: List[date]
+    series: List[CfdSeries]
+
+class LeadTimeSummary(BaseModel):
+    completed: int
+    avg_lead_hours: Optional[float] = None
+    avg_cycle_hours: Optional[float] = None
+
+class LeadTimeDay(BaseModel):
+    date: date
+    completed: int
+    avg_lead_hours: Optional[float] = None
+    avg_cycle_hours: Optional[float] = None
+
+class LeadTimeResponse(BaseModel):
+    project_id: int
+    days: List[LeadTimeDay]
+    total: LeadTimeSummary
+
+# Заранее собранные сериализаторы списков для кэшируемых ответов
+ProjectDetailsListAdapter = TypeAdapter(List[ProjectDetails])
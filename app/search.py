@@ -0,0 +1,90 @@
+import re
+from sqlalchemy import delete, distinct, event, func, insert, inspect, literal, select, union_all
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from . import models
+from .events import column_project_id
+
+# Поиск задач по инвертированному индексу task_search_terms (термин -> задача)
+# внутри проекта. Индекс хранится в БД и обновляется в той же транзакции, что и
+# задача, поэтому одинаков для всех воркеров. Поиск по префиксу термина - это
+# диапазон по первичному ключу (project_id, term, task_id), а не LIKE по tasks.
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Уникальные термины в нижнем регистре, в порядке появления."""
+    if not text:
+        return []
+    return list(dict.fromkeys(token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(text.lower())))
+
+def task_terms(task) -> list[str]:
+    return list(dict.fromkeys(tokenize(task.title) + tokenize(task.description)))
+
+def index_tasks(conn: Connection, tasks: list):
+    """Перестраивает термины задач; tasks - пары (задача или строка с title/description, project_id)."""
+    if not tasks:
+        return
+    conn.execute(delete(models.TaskSearchTerm).where(models.TaskSearchTerm.task_id.in_([t.id for t, _ in tasks])))
+    rows = [
+        {"project_id": project_id, "term": term, "task_id": task.id}
+        for task, project_id in tasks for term in task_terms(task)
+    ]
+    if rows:
+        conn.execute(insert(models.TaskSearchTerm), rows)
+
+@event.listens_for(Session, "after_flush")
+def _index_changed_tasks(session: Session, flush_context):
+    changed = []
+    for task in list(session.new) + list(session.dirty):
+        if not isinstance(task, models.Task):
+            continue
+        if task not in session.new:
+            attrs = inspect(task).attrs
+            if not (attrs.title.history.has_changes() or attrs.description.history.has_changes()):
+                continue  # is_active и позиция на индекс не влияют
+        changed.append((task, column_project_id(session, task.column_id)))
+    index_tasks(session.connection(), changed)
+
+
+def search_query(project_id: int, q: str, columns: list, limit: int):
+    """select активных задач, содержащих все слова запроса (по префиксу), по убыванию числа совпадений.
+
+    None для запроса без слов. Запрос без сессии - его выполняют и Session, и AsyncSession.
+    """
+    tokens = tokenize(q)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    terms = models.TaskSearchTerm
+    matches = union_all(*[
+        select(terms.task_id, literal(i).label("token")).where(
+            terms.project_id == project_id,
+            terms.term.startswith(token, autoescape=True)
+        )
+        for i, token in enumerate(tokens)
+    ]).subquery()
+    ranked = select(matches.c.task_id, func.count().label("score")).group_by(matches.c.task_id).having(
+        func.count(distinct(matches.c.token)) == len(tokens)
+    ).subquery()
+    return select(*columns).join(ranked, ranked.c.task_id == models.Task.id).where(
+        models.Task.is_active == True
+    ).order_by(ranked.c.score.desc(), models.Task.id).limit(limit)
+
+def rebuild_index(conn: Connection, chunk_size: int = 1000):
+    """Полная переиндексация задач порциями по id (для существующих баз)."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(models.Task.id, models.Task.title, models.Task.description, models.Column.project_id)
+            .join(models.Column, models.Column.id == models.Task.column_id)
+            .where(models.Task.id > last_id)
+            .order_by(models.Task.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        index_tasks(conn, [(row, row.project_id) for row in rows])
+        last_id = rows[-1].id
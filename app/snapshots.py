@@ -0,0 +1,92 @@
+import hashlib
+from fastapi import Request, Response
+from sqlalchemy import insert, update
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from . import models
+from .cache import ByteLRUCache
+from .database import insert_or_update
+from .events import column_project_id
+
+# Кэш сериализованных ответов по версии проекта. Любое изменение задачи,
+# колонки, проекта или его участников в той же транзакции увеличивает
+# project_versions.version, поэтому старые записи кэша просто перестают
+# запрашиваться и вытесняются LRU.
+
+SNAPSHOT_CACHE_BYTES = 64 * 1024 * 1024
+snapshot_cache = ByteLRUCache(max_bytes=SNAPSHOT_CACHE_BYTES)
+
+
+def _changed_project_ids(session: Session) -> set:
+    project_ids = set()
+    changed = list(session.new) + list(session.deleted)
+    changed += [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+    for obj in changed:
+        if isinstance(obj, models.Task):
+            project_ids.add(column_project_id(session, obj.column_id))
+        elif isinstance(obj, models.Column):
+            project_ids.add(obj.project_id)
+        elif isinstance(obj, models.Project):
+            project_ids.add(obj.id)
+        elif isinstance(obj, models.ProjectMember):
+            project_ids.add(obj.project_id)
+    project_ids.discard(None)
+    return project_ids
+
+def bump_versions(session: Session, project_ids):
+    """Увеличивает версии проектов в текущей транзакции."""
+    conn = session.connection()
+    for project_id in sorted(project_ids):  # Один порядок блокировок для всех транзакций
+        bump = (
+            update(models.ProjectVersion)
+            .where(models.ProjectVersion.project_id == project_id)
+            .values(version=models.ProjectVersion.version + 1)
+        )
+        if not conn.execute(bump).rowcount:
+            insert_or_update(conn, insert(models.ProjectVersion).values(project_id=project_id, version=1), bump)
+
+@event.listens_for(Session, "after_flush")
+def _bump_changed_projects(session: Session, flush_context):
+    project_ids = _changed_project_ids(session)
+    if project_ids:
+        bump_versions(session, project_ids)
+
+
+def etag_for(endpoint: str, params: tuple, version) -> str:
+    digest = hashlib.blake2b(repr((endpoint, params, version)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+def _response(cached, etag: str) -> Response:
+    body, headers = cached
+    return Response(content=body, media_type="application/json", headers={**headers, "ETag": etag})
+
+def cached_response(request: Request, endpoint: str, params: tuple, version, build) -> Response:
+    """304 по If-None-Match, иначе готовые байты из кэша или build() -> (body, headers)."""
+    etag = etag_for(endpoint, params, version)
+    if _matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    key = (endpoint, params, version)
+    cached = snapshot_cache.get(key)
+    if cached is None:
+        cached = build()
+        snapshot_cache.set(key, cached, len(cached[0]))
+    return _response(cached, etag)
+
+async def cached_response_async(request: Request, endpoint: str, params: tuple, version, build) -> Response:
+    """cached_response() для async def: build - корутинная функция."""
+    etag = etag_for(endpoint, params, version)
+    if _matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    key = (endpoint, params, version)
+    cached = snapshot_cache.get(key)
+    if cached is None:
+        cached = await build()
+        snapshot_cache.set(key, cached, len(cached[0]))
+    return _response(cached, etag)
@@ -0,0 +1,158 @@
+"""Бенчмарк допуска запросов (app/admission.py): задержки обычных пользователей под злоупотребляющим клиентом.
+
+Обычные пользователи (--users) ходят последовательно, с паузой --think-ms между
+запросами, по смеси чтений и правок своей доски. Злоупотребляющий клиент - один
+токен и --abuser-concurrency параллельных циклов, всего до --abuser-rps запросов
+в секунду (на порядок выше лимита пользователя): отказы 429/503 он игнорирует.
+Клиенты и приложение делят один процесс и цикл событий, поэтому поток абьюзера
+ограничен: без ограничения бенчмарк мерил бы собственный клиент, а не сервер.
+Три прогона по --seconds секунд:
+  baseline      - без злоупотребляющего клиента;
+  admission off - с ним, лимиты выключены: запросы ждут в очереди к потокам и пулу БД;
+  admission on  - с ним и с лимитами: его лишние запросы отклоняются сразу.
+С включенными лимитами p99 обычных пользователей должен остаться близким к baseline.
+
+Запуск: python -m benchmarks.admission [--seconds 10] [--users 8] [--abuser-concurrency 64] [--abuser-rps 400]
+                                       [--output admission.json]
+Нужен httpx (как и для fastapi.testclient).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.dataset import PASSWORD, DatasetConfig, email, seed
+from benchmarks.load import SCENARIOS, Worker, percentile
+
+GOOD_MIX = {"board": 3, "column_tasks": 4, "read_task": 4, "update_task": 1}
+ABUSER_SCENARIO = "board"
+
+
+async def login(client, dataset, project_id: int) -> Worker:
+    user_id = dataset.owners[project_id]
+    response = await client.post("/token", data={"username": email(user_id), "password": PASSWORD})
+    response.raise_for_status()
+    return Worker(
+        user_id=user_id,
+        project_id=project_id,
+        columns=dataset.columns[project_id],
+        tasks=[t for ids in dataset.tasks[project_id].values() for t in ids],
+        headers={"Authorization": f"Bearer {response.json()['access_token']}"},
+    )
+
+async def make_clients(client, dataset, users: int):
+    """Обычные пользователи и злоупотребляющий клиент - владельцы разных проектов (разные ключи лимита)."""
+    project_ids, seen = [], set()
+    for project_id, owner in sorted(dataset.owners.items()):
+        if owner not in seen:
+            seen.add(owner)
+            project_ids.append(project_id)
+    if len(project_ids) < users + 1:
+        raise SystemExit(f"в наборе {len(project_ids)} разных владельцев проектов, нужно {users + 1}")
+    workers = [await login(client, dataset, project_id) for project_id in project_ids[:users + 1]]
+    return workers[:-1], workers[-1]
+
+async def run_scenario(client, dataset, good, abuser, args, with_abuser: bool, admission: bool) -> dict:
+    from app import config
+    from app.admission import admission_control
+
+    config.ADMISSION_ENABLED = admission
+    admission_control.reset()
+    rnd = random.Random(args.seed)
+    names, weights = list(GOOD_MIX), list(GOOD_MIX.values())
+    good_latencies, good_status, abuser_status = [], Counter(), Counter()
+    deadline = time.perf_counter() + args.seconds
+
+    async def good_loop(worker):
+        while time.perf_counter() < deadline:
+            _, method, url, kwargs, _ = SCENARIOS[rnd.choices(names, weights)[0]](worker, dataset, rnd)
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=worker.headers, **kwargs)
+            good_latencies.append(time.perf_counter() - started)
+            good_status[response.status_code] += 1
+            await asyncio.sleep(args.think_ms / 1000)
+
+    async def abuser_loop():
+        interval = args.abuser_concurrency / args.abuser_rps
+        # Циклы стартуют вразнобой, иначе шли бы синхронными залпами по --abuser-concurrency запросов
+        await asyncio.sleep(rnd.uniform(0, interval))
+        while time.perf_counter() < deadline:
+            _, method, url, kwargs, _ = SCENARIOS[ABUSER_SCENARIO](abuser, dataset, rnd)
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=abuser.headers, **kwargs)
+            abuser_status[response.status_code] += 1
+            # Retry-After игнорируется: следующий запрос - как только позволяет заданный поток
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    loops = [good_loop(worker) for worker in good]
+    if with_abuser:
+        loops += [abuser_loop() for _ in range(args.abuser_concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*loops)
+    wall = time.perf_counter() - started
+    good_latencies.sort()
+    return {
+        "good_requests": len(good_latencies),
+        "good_rps": round(len(good_latencies) / wall, 2),
+        "good_p50_ms": round(percentile(good_latencies, 0.50) * 1000, 3),
+        "good_p99_ms": round(percentile(good_latencies, 0.99) * 1000, 3),
+        "good_status": {str(code): count for code, count in sorted(good_status.items())},
+        "abuser_status": {str(code): count for code, count in sorted(abuser_status.items())},
+        "admission": admission_control.stats(),
+    }
+
+async def run(args, dataset) -> dict:
+    import httpx
+    from app.main import create_app, lifespan
+
+    app = create_app()
+    results = {}
+    async with lifespan(app):
+        # Без перегрузочной защиты часть запросов падает по таймауту пула: это 500, а не исключение бенчмарка
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False, client=("10.0.0.1", 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            good, abuser = await make_clients(client, dataset, args.users)
+            for name, with_abuser, admission in (("baseline", False, True), ("admission off", True, False),
+                                                 ("admission on", True, True)):
+                results[name] = await run_scenario(client, dataset, good, abuser, args, with_abuser, admission)
+                print_result(name, results[name])
+    return results
+
+def print_result(name: str, result: dict):
+    print(f"{name:<15} обычные: {result['good_requests']} запр., {result['good_rps']} запр/с, "
+          f"p50 {result['good_p50_ms']} мс, p99 {result['good_p99_ms']} мс, коды {result['good_status']}; "
+          f"злоупотребляющий: коды {result['abuser_status']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=8, help="обычных пользователей")
+    parser.add_argument("--think-ms", type=float, default=250, help="пауза обычного пользователя между запросами")
+    parser.add_argument("--abuser-concurrency", type=int, default=64)
+    parser.add_argument("--abuser-rps", type=float, default=400, help="поток запросов злоупотребляющего клиента")
+    parser.add_argument("--seed", type=int, default=DatasetConfig.seed)
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # До импорта app: конфигурация читается из окружения один раз
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'admission.db')}"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        from app.database import get_engine
+
+        dataset = seed(get_engine(), DatasetConfig(users=50, projects=max(20, args.users * 2), seed=args.seed))
+        print(f"набор данных: {dataset.counts()}")
+        results = asyncio.run(run(args, dataset))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"dataset": dataset.counts(), "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
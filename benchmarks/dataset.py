@@ -0,0 +1,133 @@
+"""Синтетический набор данных для бенчмарков: пользователи, проекты, участники, колонки, задачи, логи.
+
+Данные вставляются пачками через core insert с заранее известными id, поэтому
+набор детерминирован (при одном и том же --seed) и не зависит от событий сессии;
+счетчики задач и поисковый индекс затем строятся штатными функциями. Задачи и
+логи пишутся по мере генерации, так что память не растет с размером набора.
+
+Модули app импортируются внутри функций: DATABASE_URL должен быть задан до импорта.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+PASSWORD = "benchmark"
+WORDS = ["отчет", "релиз", "ошибка", "дизайн", "клиент", "оплата", "поиск", "доска", "api", "тест",
+         "миграция", "индекс", "кэш", "логин", "экспорт", "импорт", "метрики", "сервер", "очередь", "права"]
+CHUNK = 5000
+
+
+@dataclass
+class DatasetConfig:
+    users: int = 200
+    projects: int = 50
+    members_per_project: int = 5
+    columns_per_project: int = 5
+    tasks_per_column: int = 40
+    logs_per_task: int = 3
+    seed: int = 42
+    # Поисковый индекс на миллионах задач строится дольше самого замера
+    search_index: bool = True
+
+
+@dataclass
+class Dataset:
+    config: DatasetConfig
+    # project_id -> владелец, колонки, задачи по колонкам
+    owners: dict = field(default_factory=dict)
+    columns: dict = field(default_factory=dict)
+    tasks: dict = field(default_factory=dict)
+
+    def counts(self) -> dict:
+        tasks = sum(len(ids) for by_column in self.tasks.values() for ids in by_column.values())
+        return {
+            "users": self.config.users,
+            "projects": self.config.projects,
+            "members": self.config.projects * self.config.members_per_project,
+            "columns": sum(len(c) for c in self.columns.values()),
+            "tasks": tasks,
+            "task_logs": tasks * self.config.logs_per_task,
+        }
+
+
+def email(user_id: int) -> str:
+    return f"user{user_id}@bench.local"
+
+def _insert(conn, model, rows: list):
+    from sqlalchemy import insert
+    for start in range(0, len(rows), CHUNK):
+        conn.execute(insert(model), rows[start:start + CHUNK])
+
+def seed(engine, config: DatasetConfig) -> Dataset:
+    """Создает схему и заполняет пустую базу."""
+    from app import crud, migrations, models
+    from app.auth import get_password_hash
+    from app.ranking import evenly_spaced_ranks
+    from app.search import rebuild_index
+    from sqlalchemy.orm import Session
+
+    rnd = random.Random(config.seed)
+    migrations.upgrade(engine)
+    dataset = Dataset(config)
+    # Один хеш на всех: bcrypt на каждого пользователя сделал бы наполнение дольше самого замера
+    hashed = get_password_hash(PASSWORD)
+    started = datetime(2024, 1, 1)
+    ranks = evenly_spaced_ranks(config.tasks_per_column)
+
+    users = [{"id": i, "email": email(i), "hashed_password": hashed, "is_active": True}
+             for i in range(1, config.users + 1)]
+    pending = {model: [] for model in (models.Project, models.ProjectMember, models.Column, models.Task, models.TaskLog)}
+
+    def flush(conn):
+        # Родительские строки раньше дочерних: внешние ключи проверяются сразу
+        for model, rows in pending.items():
+            _insert(conn, model, rows)
+            rows.clear()
+
+    task_id = column_id = 0
+    with engine.begin() as conn:
+        _insert(conn, models.User, users)
+        for project_id in range(1, config.projects + 1):
+            owner_id = (project_id - 1) % config.users + 1
+            dataset.owners[project_id] = owner_id
+            pending[models.Project].append(
+                {"id": project_id, "name": f"Проект {project_id}", "owner_id": owner_id, "is_active": True}
+            )
+            others = [u for u in rnd.sample(range(1, config.users + 1), min(config.users, config.members_per_project + 1))
+                      if u != owner_id][:config.members_per_project]
+            pending[models.ProjectMember].extend({"project_id": project_id, "user_id": user_id} for user_id in others)
+            dataset.columns[project_id] = []
+            dataset.tasks[project_id] = {}
+            for order in range(config.columns_per_project):
+                column_id += 1
+                dataset.columns[project_id].append(column_id)
+                dataset.tasks[project_id][column_id] = []
+                pending[models.Column].append({"id": column_id, "name": f"Колонка {order}", "order": order,
+                                               "project_id": project_id, "is_active": True})
+                for position in range(config.tasks_per_column):
+                    task_id += 1
+                    dataset.tasks[project_id][column_id].append(task_id)
+                    created_at = started + timedelta(minutes=task_id)
+                    pending[models.Task].append({
+                        "id": task_id,
+                        "title": " ".join(rnd.sample(WORDS, 3)) + f" {task_id}",
+                        "description": " ".join(rnd.choices(WORDS, k=12)),
+                        "column_id": column_id,
+                        "author_id": owner_id,
+                        "priority": rnd.randint(1, 3),
+                        "rank": ranks[position],
+                        "created_at": created_at,
+                        "is_active": True,
+                    })
+                    pending[models.TaskLog].extend(
+                        {"task_id": task_id, "user_id": owner_id, "message": "Задача изменена",
+                         "created_at": created_at + timedelta(hours=n)} for n in range(config.logs_per_task)
+                    )
+                    if len(pending[models.Task]) >= CHUNK:
+                        flush(conn)
+        flush(conn)
+        if config.search_index:
+            rebuild_index(conn)
+    with Session(engine) as db:
+        crud.rebuild_task_counters(db)
+    return dataset
@@ -0,0 +1,337 @@
+"""Нагрузочный бенчмарк: настоящее приложение FastAPI поверх локальной SQLite.
+
+Наполняет базу синтетическим набором (см. dataset.py) и гоняет смесь запросов
+(логин, доска, /projects/me/, чтение и CRUD задач, поиск) через ASGI-транспорт
+httpx на заданных уровнях конкурентности - как один воркер uvicorn. Для каждого
+эндпоинта (по шаблону маршрута) считает пропускную способность, p50/p95/p99 и
+число SQL-запросов на запрос. Логин идет вперемешку с остальной нагрузкой, так
+что видно и его пропускную способность, и влияние bcrypt на соседние запросы.
+
+Результаты пишутся в JSON; с --baseline прогон сравнивается с предыдущим и
+завершается с кодом 1 при регрессии больше --max-regression.
+
+Запуск:
+  python -m benchmarks.load [--concurrency 1 8 32] [--requests 2000] [--output load.json]
+  python -m benchmarks.load --baseline load.json --max-regression 0.2
+Нужен httpx (как и для fastapi.testclient).
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from benchmarks.dataset import PASSWORD, WORDS, DatasetConfig, email, seed
+
+# Смесь запросов по умолчанию: сценарий -> вес
+DEFAULT_MIX = {
+    "board": 20,
+    "user_projects": 15,
+    "column_tasks": 20,
+    "read_task": 15,
+    "search": 5,
+    "create_task": 8,
+    "update_task": 7,
+    "move_task": 5,
+    "delete_task": 3,
+    "login": 2,
+}
+# Эндпоинты с меньшим числом замеров не сравниваются по задержкам: слишком шумно
+MIN_SAMPLES_TO_COMPARE = 20
+
+current_endpoint = contextvars.ContextVar("current_endpoint", default="background")
+
+
+class QueryCounter:
+    """Число SQL-запросов по эндпоинтам; вне запроса (аудит, фоновые задачи) - "background"."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        from sqlalchemy import event
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.counts[current_endpoint.get()] += 1
+
+    def take(self) -> Counter:
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+        return counts
+
+
+@dataclass
+class Worker:
+    user_id: int
+    project_id: int
+    columns: list
+    tasks: list
+    headers: dict = field(default_factory=dict)
+    created: list = field(default_factory=list)
+
+
+# Сценарии возвращают (метка, метод, url, параметры запроса, обработчик ответа)
+
+def board(worker, dataset, rnd):
+    return "GET /projects/{project_id}/board", "GET", f"/projects/{worker.project_id}/board", {}, None
+
+def user_projects(worker, dataset, rnd):
+    return "GET /projects/me/", "GET", "/projects/me/", {}, None
+
+def column_tasks(worker, dataset, rnd):
+    url = f"/columns/{rnd.choice(worker.columns)}/tasks/"
+    return "GET /columns/{column_id}/tasks/", "GET", url, {"params": {"limit": 50}}, None
+
+def read_task(worker, dataset, rnd):
+    return "GET /tasks/{task_id}", "GET", f"/tasks/{rnd.choice(worker.tasks)}", {}, None
+
+def search(worker, dataset, rnd):
+    url = f"/projects/{worker.project_id}/tasks/search"
+    return "GET /projects/{project_id}/tasks/search", "GET", url, {"params": {"q": rnd.choice(WORDS)[:4]}}, None
+
+def create_task(worker, dataset, rnd):
+    def remember(response):
+        worker.created.append(response.json()["id"])
+    body = {"title": " ".join(rnd.sample(WORDS, 3)), "description": "нагрузочный тест", "priority": 2}
+    url = f"/columns/{rnd.choice(worker.columns)}/tasks/"
+    return "POST /columns/{column_id}/tasks/", "POST", url, {"json": body}, remember
+
+def update_task(worker, dataset, rnd):
+    body = {"title": " ".join(rnd.sample(WORDS, 3)), "description": "обновлено", "priority": rnd.randint(1, 3)}
+    return "PUT /tasks/{task_id}", "PUT", f"/tasks/{rnd.choice(worker.tasks)}", {"json": body}, None
+
+def move_task(worker, dataset, rnd):
+    url = f"/tasks/{rnd.choice(worker.tasks)}/move"
+    return "POST /tasks/{task_id}/move", "POST", url, {"json": {"column_id": rnd.choice(worker.columns)}}, None
+
+def delete_task(worker, dataset, rnd):
+    if not worker.created:
+        return create_task(worker, dataset, rnd)
+    return "DELETE /tasks/{task_id}", "DELETE", f"/tasks/{worker.created.pop()}", {}, None
+
+def login(worker, dataset, rnd):
+    data = {"username": email(rnd.randint(1, dataset.config.users)), "password": PASSWORD}
+    return "POST /token", "POST", "/token", {"data": data}, None
+
+SCENARIOS = {f.__name__: f for f in (
+    board, user_projects, column_tasks, read_task, search, create_task, update_task, move_task, delete_task, login
+)}
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+async def make_workers(client, dataset, concurrency: int) -> list:
+    workers = []
+    for i in range(concurrency):
+        project_id = i % dataset.config.projects + 1
+        user_id = dataset.owners[project_id]
+        response = await client.post("/token", data={"username": email(user_id), "password": PASSWORD})
+        response.raise_for_status()
+        workers.append(Worker(
+            user_id=user_id,
+            project_id=project_id,
+            columns=dataset.columns[project_id],
+            tasks=[t for ids in dataset.tasks[project_id].values() for t in ids],
+            headers={"Authorization": f"Bearer {response.json()['access_token']}"},
+        ))
+    return workers
+
+async def run_level(app, dataset, counter, concurrency: int, total: int, mix: dict, seed_value: int) -> dict:
+    import httpx
+
+    rnd = random.Random(seed_value)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    errors = Counter()
+    remaining = total
+
+    async def loop(worker):
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            label, method, url, kwargs, on_response = SCENARIOS[rnd.choices(names, weights)[0]](worker, dataset, rnd)
+            token = current_endpoint.set(label)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=worker.headers, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                current_endpoint.reset(token)
+            latencies[label].append(elapsed)
+            if response.status_code >= 400:
+                errors[label] += 1
+            elif on_response:
+                on_response(response)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        workers = await make_workers(client, dataset, concurrency)
+        counter.take()
+        started = time.perf_counter()
+        await asyncio.gather(*(loop(worker) for worker in workers))
+        wall = time.perf_counter() - started
+    queries = counter.take()
+
+    endpoints = {}
+    for label, values in sorted(latencies.items()):
+        values.sort()
+        endpoints[label] = {
+            "requests": len(values),
+            "errors": errors[label],
+            "rps": round(len(values) / wall, 2),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+            "sql_per_request": round(queries[label] / len(values), 3),
+        }
+    everything = sorted(v for values in latencies.values() for v in values)
+    return {
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "requests": len(everything),
+        "errors": sum(errors.values()),
+        "rps": round(len(everything) / wall, 2),
+        "p50_ms": round(percentile(everything, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(everything, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(everything, 0.99) * 1000, 3),
+        "background_sql": queries["background"],
+        "endpoints": endpoints,
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Регрессии относительно прошлого прогона: p95, пропускная способность, число SQL-запросов."""
+    failures = []
+    for level, run in result["runs"].items():
+        base_run = baseline.get("runs", {}).get(level)
+        if not base_run:
+            continue
+        for label, stats in run["endpoints"].items():
+            base = base_run["endpoints"].get(label)
+            if not base:
+                continue
+            where = f"[{level}] {label}"
+            if stats["sql_per_request"] > base["sql_per_request"] * (1 + max_regression) + 0.01:
+                failures.append(f"{where}: SQL на запрос {base['sql_per_request']} -> {stats['sql_per_request']}")
+            if min(stats["requests"], base["requests"]) < MIN_SAMPLES_TO_COMPARE:
+                continue
+            if stats["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+                failures.append(f"{where}: p95 {base['p95_ms']} -> {stats['p95_ms']} мс")
+        if run["rps"] < base_run["rps"] * (1 - max_regression):
+            failures.append(f"[{level}] пропускная способность {base_run['rps']} -> {run['rps']} запр/с")
+    return failures
+
+def print_run(run: dict):
+    print(f"\nконкурентность {run['concurrency']}: {run['requests']} запросов за {run['wall_s']} с, "
+          f"{run['rps']} запр/с, p95 {run['p95_ms']} мс, ошибок {run['errors']}, SQL вне запросов {run['background_sql']}")
+    print(f"  {'эндпоинт':<42}{'запр/с':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'SQL':>7}{'ош.':>6}")
+    for label, s in run["endpoints"].items():
+        print(f"  {label:<42}{s['rps']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}"
+              f"{s['sql_per_request']:>7}{s['errors']:>6}")
+
+
+async def run(args, dataset, counter) -> dict:
+    from app.main import create_app, lifespan
+
+    app = create_app()
+    mix = dict(DEFAULT_MIX, **dict(item.split("=") for item in args.mix)) if args.mix else DEFAULT_MIX
+    mix = {name: float(weight) for name, weight in mix.items() if float(weight) > 0}
+    runs = {}
+    async with lifespan(app):
+        if args.warmup:
+            await run_level(app, dataset, counter, args.concurrency[0], args.warmup, mix, args.seed - 1)
+        for concurrency in args.concurrency:
+            runs[str(concurrency)] = await run_level(app, dataset, counter, concurrency, args.requests, mix, args.seed)
+            print_run(runs[str(concurrency)])
+    return {"mix": mix, "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на каждый уровень конкурентности")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--mix", nargs="*", metavar="СЦЕНАРИЙ=ВЕС", help=f"веса сценариев: {', '.join(SCENARIOS)}")
+    parser.add_argument("--users", type=int, default=DatasetConfig.users)
+    parser.add_argument("--projects", type=int, default=DatasetConfig.projects)
+    parser.add_argument("--members-per-project", type=int, default=DatasetConfig.members_per_project)
+    parser.add_argument("--columns-per-project", type=int, default=DatasetConfig.columns_per_project)
+    parser.add_argument("--tasks-per-column", type=int, default=DatasetConfig.tasks_per_column)
+    parser.add_argument("--logs-per-task", type=int, default=DatasetConfig.logs_per_task)
+    parser.add_argument("--seed", type=int, default=DatasetConfig.seed)
+    parser.add_argument("--memory", action="store_true", help="файл базы в tmpfs (/dev/shm) вместо временного каталога")
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="допустимое ухудшение, доля (0.2 = 20%%)")
+    args = parser.parse_args()
+    unknown = set(item.split("=")[0] for item in args.mix or []) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    # Общий кэш in-memory SQLite блокирует таблицы целиком и под конкурентной
+    # нагрузкой падает с "database table is locked"; файл в tmpfs - та же память,
+    # но с обычными блокировками. Sync и async движки видят одну базу.
+    memory_dir = "/dev/shm" if args.memory and os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=memory_dir) as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # До импорта app: конфигурация читается из окружения один раз
+        os.environ["DATABASE_URL"] = url
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+        # Меряется пропускная способность приложения, а не лимиты допуска (см. benchmarks.admission)
+        os.environ["ADMISSION_ENABLED"] = "0"
+        from app.database import get_async_engine, get_engine
+
+        config = DatasetConfig(args.users, args.projects, args.members_per_project, args.columns_per_project,
+                               args.tasks_per_column, args.logs_per_task, args.seed)
+        started = time.perf_counter()
+        dataset = seed(get_engine(), config)
+        print(f"набор данных: {dataset.counts()} за {time.perf_counter() - started:.1f} с")
+
+        counter = QueryCounter()
+        counter.attach(get_engine())
+        counter.attach(get_async_engine().sync_engine)
+        outcome = asyncio.run(run(args, dataset, counter))
+
+    import sqlalchemy
+    result = {
+        "meta": {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "database": "memory" if args.memory else "file",
+            "requests_per_level": args.requests,
+            "mix": outcome["mix"],
+        },
+        "dataset": dataset.counts(),
+        "runs": outcome["runs"],
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(result, json.load(f), args.max_regression)
+        if failures:
+            print("\nРЕГРЕССИЯ:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+        print("\nрегрессий относительно прошлого прогона нет")
+
+
+if __name__ == "__main__":
+    main()
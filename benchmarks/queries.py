@@ -0,0 +1,111 @@
+"""Бенчмарк чтений crud.py: число строк и время каждого запроса с составными индексами и без них.
+
+Наполняет SQLite синтетическим набором (см. dataset.py), замеряет чтения, затем
+удаляет индексы под формы запросов (миграция 2 и ix_tasks_column_rank) и замеряет
+снова. Покажет, какие чтения без индексов превращаются в сканы.
+
+Запуск: python -m benchmarks.queries [--projects 200] [--repeat 20] [--output queries.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.dataset import DatasetConfig, seed
+
+QUERY_INDEXES = [
+    "ix_tasks_column_rank",
+    "ix_tasks_column_active_priority",
+    "ix_tasks_active_column_rank",
+    "ix_columns_project_active",
+    "ix_projects_owner_active",
+    "ix_project_members_user",
+    "ix_task_logs_task_created",
+]
+
+
+def reads(dataset) -> dict:
+    """Чтения crud.py с параметрами из середины набора: имя -> функция(db) -> строки."""
+    from app import crud
+
+    project_id = dataset.config.projects // 2 + 1
+    column_id = dataset.columns[project_id][0]
+    task_id = dataset.tasks[project_id][column_id][0]
+    user_id = dataset.owners[project_id]
+    project_ids = list(range(1, dataset.config.projects + 1))
+    return {
+        "get_tasks_by_column": lambda db: crud.get_tasks_by_column(
+            db, column_id, None, 50, None, columns=crud.TASK_RESPONSE_COLUMNS)[0],
+        "get_tasks_by_column(priority)": lambda db: crud.get_tasks_by_column(
+            db, column_id, 1, 50, None, columns=crud.TASK_RESPONSE_COLUMNS)[0],
+        "get_projects": lambda db: crud.get_projects(
+            db, user_id, True, 100, None, columns=crud.PROJECT_RESPONSE_COLUMNS)[0],
+        "get_task_logs": lambda db: crud.get_task_logs(db, task_id, 100, None, columns=crud.TASK_LOG_RESPONSE_COLUMNS)[0],
+        "get_user_projects": lambda db: crud.get_user_projects(db, user_id),
+        "get_active_task_counts": lambda db: list(crud.get_active_task_counts(db, project_ids).items()),
+        "get_board": lambda db: [t for c in crud.get_board(db, project_id).columns for t in c.tasks],
+        "search_tasks": lambda db: crud.search_tasks(db, project_id, "отч", 50, columns=crud.TASK_RESPONSE_COLUMNS),
+    }
+
+def measure(engine, queries: dict, repeat: int) -> dict:
+    from sqlalchemy.orm import Session
+
+    result = {}
+    for name, query in queries.items():
+        timings = []
+        for _ in range(repeat):
+            with Session(engine) as db:
+                started = time.perf_counter()
+                rows = query(db)
+                timings.append(time.perf_counter() - started)
+        result[name] = {"rows": len(rows), "median_ms": round(statistics.median(timings) * 1000, 3),
+                        "max_ms": round(max(timings) * 1000, 3)}
+    return result
+
+def drop_indexes(engine):
+    from sqlalchemy import text
+    with engine.begin() as conn:
+        for name in QUERY_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        conn.execute(text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--columns-per-project", type=int, default=5)
+    parser.add_argument("--tasks-per-column", type=int, default=100)
+    parser.add_argument("--logs-per-task", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'queries.db')}"
+        from app.database import get_engine
+
+        engine = get_engine()
+        config = DatasetConfig(users=args.users, projects=args.projects, columns_per_project=args.columns_per_project,
+                               tasks_per_column=args.tasks_per_column, logs_per_task=args.logs_per_task)
+        dataset = seed(engine, config)
+        print(f"набор данных: {dataset.counts()}")
+        queries = reads(dataset)
+        with_indexes = measure(engine, queries, args.repeat)
+        drop_indexes(engine)
+        without_indexes = measure(engine, queries, args.repeat)
+        engine.dispose()
+
+    print(f"{'чтение':<32}{'строк':>7}{'с индексами':>14}{'без индексов':>15}")
+    for name, stats in with_indexes.items():
+        print(f"{name:<32}{stats['rows']:>7}{stats['median_ms']:>11} мс{without_indexes[name]['median_ms']:>12} мс")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"dataset": dataset.counts(), "with_indexes": with_indexes,
+                       "without_indexes": without_indexes}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Микро-бенчмарк сериализации списка задач: путь FastAPI/Pydantic против строк БД + fastjson.
+
+Запуск: python -m benchmarks.serialization [--sizes 10000 100000] [--repeat 3]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.fastjson import rows_to_json
+
+FIELDS = list(schemas.TaskResponse.model_fields)
+
+
+def make_rows(count: int) -> list[tuple]:
+    start = datetime(2024, 1, 1)
+    return [
+        (f"Задача {i}", f"Описание задачи {i}" if i % 3 else None, i % 3 + 1, i, i % 50 + 1, i % 12 + 1,
+         start + timedelta(seconds=i), True, i % 5 + 1)
+        for i in range(count)
+    ]
+
+def pydantic_path(objects) -> bytes:
+    # То, что делает FastAPI для response_model=list[TaskResponse]: валидация from_attributes и json.dumps
+    adapter = TypeAdapter(list[schemas.TaskResponse])
+    content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+def fast_path(rows) -> bytes:
+    return rows_to_json(rows, FIELDS)
+
+def measure(func, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rows = make_rows(size)
+        objects = [SimpleNamespace(**dict(zip(FIELDS, row))) for row in rows]
+        assert pydantic_path(objects) == fast_path(rows), "ответы должны совпадать байт в байт"
+        slow = measure(pydantic_path, objects, args.repeat)
+        fast = measure(fast_path, rows, args.repeat)
+        print(f"{size:>8} задач: pydantic {slow * 1000:8.1f} мс, fastjson {fast * 1000:8.1f} мс, x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Бенчмарк запуска воркера: время импорта app.main и время до первого ответа.
+
+Каждый замер - в новом процессе интерпретатора, как при старте воркера uvicorn.
+Завершается с кодом 1, если медиана превышает порог (защита от регрессий).
+
+Запуск: python -m benchmarks.startup [--repeat 5] [--max-import-ms 1500] [--max-first-response-ms 2500]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Замер внутри дочернего процесса. Модули, которые должны загружаться лениво,
+# не должны оказаться в sys.modules после импорта приложения.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app) as client:
+    client_ready = time.perf_counter()
+    response = client.get("/")
+    answered = time.perf_counter()
+eager = [name for name in ("passlib", "bcrypt", "pyodbc", "aioodbc") if name in sys.modules]
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (imported - started + answered - client_ready) * 1000,
+    "status": response.status_code,
+    "eager_modules": eager,
+}))
+"""
+
+
+def run_probe(env: dict) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=root, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=1500)
+    parser.add_argument("--max-first-response-ms", type=float, default=2500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Пустая база без таблиц: GET / не должен требовать ни схемы, ни соединения
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+        samples = [run_probe(env) for _ in range(args.repeat)]
+        created = os.path.exists(os.path.join(tmp, "startup.db"))
+
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    first_ms = statistics.median(s["first_response_ms"] for s in samples)
+    eager = sorted({name for s in samples for name in s["eager_modules"]})
+    print(f"импорт app.main:     {import_ms:8.1f} мс (медиана из {args.repeat})")
+    print(f"до первого ответа:   {first_ms:8.1f} мс")
+    print(f"загружены при импорте: {', '.join(eager) or '-'}; файл БД создан: {'да' if created else 'нет'}")
+
+    failures = []
+    if import_ms > args.max_import_ms:
+        failures.append(f"импорт {import_ms:.1f} мс > {args.max_import_ms} мс")
+    if first_ms > args.max_first_response_ms:
+        failures.append(f"первый ответ {first_ms:.1f} мс > {args.max_first_response_ms} мс")
+    if any(s["status"] != 200 for s in samples):
+        failures.append("GET / вернул не 200")
+    if eager:
+        failures.append(f"тяжелые модули загружаются при импорте: {', '.join(eager)}")
+    if created:
+        failures.append("запуск приложения обратился к БД")
+    if failures:
+        print("РЕГРЕССИЯ: " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Бенчмарк экспорта и импорта большого проекта (app/transfer.py): время, объем и пиковая память.
+
+Наполняет SQLite одним проектом на --tasks задач (по умолчанию 1 000 000), затем
+для каждого формата выгружает его в файл и загружает обратно новым проектом.
+Каждая фаза (и наполнение) идет в отдельном процессе, а сам запускающий процесс
+app не импортирует: пик RSS процесса наследуется через fork/exec, и иначе фазы
+показали бы пик наполнения. Рост пика считается от состояния после импортов и
+при потоковой обработке не должен зависеть от --tasks.
+
+Запуск: python -m benchmarks.transfer [--tasks 1000000] [--formats ndjson csv] [--output transfer.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.dataset import DatasetConfig, seed
+
+PROJECT_ID = 1
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux отдает КБ
+
+def run_phase(args) -> dict:
+    """Одна фаза в текущем процессе; DATABASE_URL уже задан родителем."""
+    from app import transfer
+    from app.database import get_engine, new_session
+
+    engine = get_engine()
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    if args.phase == "seed":
+        config = DatasetConfig(users=50, projects=1, members_per_project=10, columns_per_project=args.columns,
+                               tasks_per_column=max(1, args.tasks // args.columns), logs_per_task=args.logs_per_task,
+                               search_index=False)
+        result = {"dataset": seed(engine, config).counts()}
+    elif args.phase == "export":
+        with open(args.file, "wb") as f:
+            for chunk in transfer.export_project(PROJECT_ID, args.format):
+                f.write(chunk)
+        result = {"bytes": os.path.getsize(args.file)}
+    else:
+        db = new_session()
+        try:
+            with open(args.file, "rb") as f:
+                project = transfer.import_project(db, f, args.format, owner_id=1)
+            result = {"project_id": project.id}
+        finally:
+            db.close()
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    result["peak_rss_growth_mb"] = round(result["peak_rss_mb"] - baseline, 1)
+    return result
+
+def phase(args, database_url: str, name: str, fmt: str = None, path: str = None) -> dict:
+    command = [sys.executable, "-m", "benchmarks.transfer", "--phase", name, "--tasks", str(args.tasks),
+               "--columns", str(args.columns), "--logs-per-task", str(args.logs_per_task)]
+    if fmt:
+        command += ["--format", fmt, "--file", path]
+    completed = subprocess.run(command, env={**os.environ, "DATABASE_URL": database_url},
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--columns", type=int, default=5)
+    parser.add_argument("--logs-per-task", type=int, default=1)
+    parser.add_argument("--formats", nargs="+", choices=["ndjson", "csv"], default=["ndjson", "csv"])
+    parser.add_argument("--output", help="куда записать результаты в JSON")
+    # Внутренние параметры дочернего процесса одной фазы
+    parser.add_argument("--phase", choices=["seed", "export", "import"], help=argparse.SUPPRESS)
+    parser.add_argument("--format", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.phase:
+        print(json.dumps(run_phase(args)))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{os.path.join(tmp, 'transfer.db')}"
+        seeded = phase(args, database_url, "seed")
+        dataset = seeded["dataset"]
+        print(f"набор данных: {dataset} за {seeded['seconds']} с")
+        for fmt in args.formats:
+            path = os.path.join(tmp, f"project.{fmt}")
+            results[fmt] = {"export": phase(args, database_url, "export", fmt, path),
+                            "import": phase(args, database_url, "import", fmt, path)}
+
+    tasks = dataset["tasks"]
+    print(f"{'формат':<8}{'фаза':<8}{'время':>10}{'задач/с':>11}{'объем':>11}{'пик RSS':>11}{'рост':>9}")
+    for fmt, phases in results.items():
+        for name, stats in phases.items():
+            size = f"{stats['bytes'] / 2 ** 20:.1f} МБ" if "bytes" in stats else ""
+            print(f"{fmt:<8}{name:<8}{stats['seconds']:>8} с{tasks / max(stats['seconds'], 0.001):>11.0f}"
+                  f"{size:>11}{stats['peak_rss_mb']:>8} МБ{stats['peak_rss_growth_mb']:>6} МБ")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"dataset": dataset, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
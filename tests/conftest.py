@@ -0,0 +1,47 @@
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# До импорта app: конфигурация читается из окружения один раз
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'tests.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.pop("READ_DATABASE_URL", None)
+os.environ["ADMISSION_ENABLED"] = "0"
+
+from fastapi.testclient import TestClient
+
+from app import migrations
+from app.database import get_engine
+from app.main import app
+
+PASSWORD = "password"
+_emails = itertools.count()
+
+
+@pytest.fixture(scope="session")
+def client():
+    migrations.upgrade(get_engine())
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def login(client):
+    """Новый пользователь; возвращает (id, заголовки с его токеном)."""
+    def login():
+        email = f"user{next(_emails)}@example.com"
+        user = client.post("/users/", json={"email": email, "password": PASSWORD}).json()
+        token = client.post("/token", data={"username": email, "password": PASSWORD}).json()["access_token"]
+        return user["id"], {"Authorization": f"Bearer {token}"}
+    return login
+
+
+@pytest.fixture
+def project(client, login):
+    """Проект нового пользователя: (id проекта, заголовки владельца)."""
+    _, headers = login()
+    project = client.post("/projects/", json={"name": "Проект"}, headers=headers).json()
+    return project["id"], headers
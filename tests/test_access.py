@@ -0,0 +1,25 @@
+def test_lists_require_token(client):
+    assert client.get("/users/").status_code == 401
+    assert client.get("/projects/all").status_code == 401
+
+
+def test_all_projects_are_only_own(client, login, project):
+    project_id, owner_headers = project
+    member_id, member_headers = login()
+    _, outsider_headers = login()
+    client.post(f"/projects/{project_id}/add-member/?user_id={member_id}", headers=owner_headers)
+
+    def listed(headers):
+        return [p["id"] for p in client.get("/projects/all", headers=headers).json()]
+
+    assert listed(owner_headers) == [project_id]
+    assert listed(member_headers) == [project_id]
+    assert listed(outsider_headers) == []
+
+
+def test_column_of_other_project_is_hidden(client, login, project):
+    project_id, headers = project
+    _, outsider_headers = login()
+    column = client.post(f"/projects/{project_id}/columns/", json={"name": "Сделать", "order": 0}, headers=headers).json()
+    assert client.get(f"/columns/{column['id']}/tasks/", headers=headers).status_code == 200
+    assert client.get(f"/columns/{column['id']}/tasks/", headers=outsider_headers).status_code == 404
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app import config
+from app.admission import AdmissionMiddleware, admission_control, client_address
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(config, "ADMISSION_ENABLED", True)
+    yield admission_control
+    monkeypatch.undo()
+    admission_control.reset()
+
+
+def scope(forwarded=None, path="/token"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return {"type": "http", "path": path, "headers": headers, "client": ("10.0.0.1", 40000)}
+
+
+def test_client_address(monkeypatch):
+    assert client_address(scope("203.0.113.7")) == "10.0.0.1"
+    monkeypatch.setattr(config, "FORWARDED_PROXIES", 1)
+    assert client_address(scope()) == "10.0.0.1"
+    # Первый адрес подделан клиентом, последний дописал прокси
+    assert client_address(scope("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+    monkeypatch.setattr(config, "FORWARDED_PROXIES", 2)
+    assert client_address(scope("1.2.3.4, 203.0.113.7, 10.0.0.2")) == "203.0.113.7"
+    assert client_address(scope("203.0.113.7")) == "203.0.113.7"
+
+
+def test_login_limit_per_forwarded_client(client, admission, monkeypatch):
+    monkeypatch.setattr(config, "FORWARDED_PROXIES", 1)
+    monkeypatch.setattr(config, "LOGIN_BURST", 2)
+    monkeypatch.setattr(config, "LOGIN_RATE", 0.01)  # Проверка пароля дольше, чем пополнение при 1/с
+    admission.reset()
+
+    def login(address):
+        data = {"username": "nobody@example.com", "password": "wrong"}
+        return client.post("/token", data=data, headers={"X-Forwarded-For": address}).status_code
+
+    assert [login("203.0.113.7") for _ in range(3)] == [401, 401, 429]
+    assert login("203.0.113.8") == 401
+
+
+def test_streaming_response_releases_key(admission):
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        started.set()
+        await finish.wait()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def send(message):
+        pass
+
+    async def run():
+        request = asyncio.create_task(AdmissionMiddleware(app)(scope(path="/projects/1/export"), None, send))
+        await started.wait()
+        in_flight = admission.stats()["in_flight"], dict(admission.in_flight_by_key)
+        finish.set()
+        await request
+        return in_flight
+
+    # Пока тело передается, запрос занимает общий предел, но не предел ключа
+    assert asyncio.run(run()) == (1, {})
+    assert admission.stats()["in_flight"] == 0
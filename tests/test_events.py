@@ -0,0 +1,29 @@
+import time
+
+from app.events import hub
+
+
+def wait_subscribers(expected: int, timeout: float = 5) -> int:
+    deadline = time.monotonic() + timeout
+    while hub.stats()["subscribers"] != expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return hub.stats()["subscribers"]
+
+
+def test_event_is_delivered(client, project):
+    project_id, headers = project
+    token = headers["Authorization"].split()[1]
+    with client.websocket_connect(f"/projects/{project_id}/events?token={token}") as ws:
+        client.post(f"/projects/{project_id}/columns/", json={"name": "Сделать", "order": 0}, headers=headers)
+        assert ws.receive_json()["type"] == "column.created"
+
+
+def test_disconnect_unsubscribes(client, project):
+    project_id, headers = project
+    token = headers["Authorization"].split()[1]
+    before = hub.stats()["subscribers"]
+    with client.websocket_connect(f"/projects/{project_id}/events?token={token}") as ws:
+        assert wait_subscribers(before + 1) == before + 1
+        # Клиент закрывает сокет, событий при этом нет: обработчик должен выйти сам
+        ws.close()
+        assert wait_subscribers(before) == before
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pydantic import TypeAdapter
+
+from app import crud, fastjson, models, schemas
+from app.database import new_session
+
+TaskListAdapter = TypeAdapter(list[schemas.TaskResponse])
+
+
+@pytest.fixture
+def column(client, project):
+    project_id, headers = project
+    column_id = client.post(f"/projects/{project_id}/columns/", json={"name": "Колонка"}, headers=headers).json()["id"]
+    return column_id, headers
+
+
+def expected_tasks(column_id: int) -> bytes:
+    with new_session() as db:
+        tasks = db.query(models.Task).filter(models.Task.column_id == column_id).order_by(models.Task.rank, models.Task.id).all()
+        return TaskListAdapter.dump_json([schemas.TaskResponse.model_validate(task) for task in tasks])
+
+
+def test_column_tasks_match_pydantic(client, column):
+    column_id, headers = column
+    for task in (
+        {"title": "Задача «один» — ёж", "description": None},
+        {"title": "emoji 🚀 \"кавычки\" \\ слэш", "description": "строка\nперевод", "priority": 1},
+        {"title": "ascii", "description": "</script>"},
+    ):
+        client.post(f"/columns/{column_id}/tasks/", json=task, headers=headers)
+    # Дата без микросекунд сериализуется без дробной части - проверяем и этот случай
+    with new_session() as db:
+        task = db.query(models.Task).filter(models.Task.column_id == column_id).first()
+        task.created_at = datetime(2026, 1, 2, 3, 4, 5)
+        db.commit()
+
+    response = client.get(f"/columns/{column_id}/tasks/", headers=headers)
+    assert response.status_code == 200
+    assert response.content == expected_tasks(column_id)
+
+
+def test_projects_me_match_pydantic(client, login, column):
+    column_id, headers = column
+    member_id, _ = login()
+    with new_session() as db:
+        project_id = db.get(models.Column, column_id).project_id
+    client.put(f"/projects/{project_id}", json={"name": "Проект «Ёлка» 🎄"}, headers=headers)
+    client.post(f"/projects/{project_id}/add-member/?user_id={member_id}", headers=headers)
+    client.post(f"/columns/{column_id}/tasks/", json={"title": "Задача"}, headers=headers)
+
+    response = client.get("/projects/me/", headers=headers)
+    assert response.status_code == 200
+    with new_session() as db:
+        owner_id = db.get(models.Project, project_id).owner_id
+        projects = crud.get_user_projects(db, owner_id)
+        counts = crud.get_active_task_counts(db, [p.id for p in projects])
+        expected = schemas.ProjectDetailsListAdapter.dump_json([
+            schemas.ProjectDetails.model_validate(p).model_copy(update={"task_count": counts.get(p.id, 0)})
+            for p in projects
+        ])
+    assert response.content == expected
+    assert response.json()[0]["name"] == "Проект «Ёлка» 🎄"
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2026, 1, 2, 3, 4, 5),
+    datetime(2026, 1, 2, 3, 4, 5, 120000),
+    datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+    datetime(2026, 1, 2, 3, 4, 5, 7, tzinfo=timezone(timedelta(hours=3))),
+])
+def test_rows_to_json_datetimes(created_at):
+    values = {"id": 1, "title": "Задача", "description": None, "priority": 2, "author_id": 1,
+              "column_id": 1, "created_at": created_at, "is_active": True, "version": 0}
+    fields = fastjson.field_names(crud.TASK_RESPONSE_COLUMNS)
+    row = tuple(values[field] for field in fields)
+    expected = TaskListAdapter.dump_json([schemas.TaskResponse(**values)])
+    assert fastjson.rows_to_json([row], fields) == expected
@@ -0,0 +1,34 @@
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app import crud, migrations, models
+
+
+def test_upgrade_fills_task_counters(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    migrations.migration_metadata.create_all(bind=engine)
+    # База до счетчиков: задачи есть, строк column_task_counters нет, миграции 1-5 применены
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "email": "old@example.com", "hashed_password": "x"}])
+        conn.execute(insert(models.Project), [{"id": 1, "name": "A", "owner_id": 1}, {"id": 2, "name": "B", "owner_id": 1}])
+        conn.execute(insert(models.Column), [
+            {"id": 1, "name": "Сделать", "order": 0, "project_id": 1},
+            {"id": 2, "name": "Готово", "order": 1, "project_id": 1},
+            {"id": 3, "name": "Пусто", "order": 0, "project_id": 2},
+        ])
+        conn.execute(insert(models.Task), [
+            {"title": f"Задача {i}", "column_id": column_id, "author_id": 1, "rank": f"{i}i", "is_active": i != 4}
+            for i, column_id in enumerate([1, 1, 1, 2, 2])
+        ])
+        conn.execute(migrations.schema_migrations.insert(), [
+            {"version": version, "name": name} for version, name, _ in migrations.MIGRATIONS if version <= 5
+        ])
+
+    migrations.upgrade(engine)
+
+    with Session(engine) as db:
+        assert crud.get_active_task_counts(db, [1, 2]) == {1: 4, 2: 0}
+        counters = {c.column_id: c.active_tasks for c in db.query(models.ColumnTaskCounter)}
+    assert counters == {1: 3, 2: 1, 3: 0}
+    engine.dispose()
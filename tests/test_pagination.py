@@ -0,0 +1,64 @@
+import base64
+import json
+
+import pytest
+
+from app.pagination import NEXT_CURSOR_HEADER, encode_cursor
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def column_tasks(client, project):
+    project_id, headers = project
+    column_id = client.post(f"/projects/{project_id}/columns/", json={"name": "Сделать", "order": 0}, headers=headers).json()["id"]
+    task_ids = [
+        client.post(f"/columns/{column_id}/tasks/", json={"title": f"Задача {i}"}, headers=headers).json()["id"]
+        for i in range(5)
+    ]
+    return column_id, task_ids, headers
+
+
+def test_pages_cover_column(client, column_tasks):
+    column_id, task_ids, headers = column_tasks
+    url = f"/columns/{column_id}/tasks/?limit=2"
+    seen, cursor = [], None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=headers)
+        assert response.status_code == 200
+        seen += [task["id"] for task in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == task_ids
+
+
+@pytest.mark.parametrize("cursor", [
+    "W3t9LDFd",  # [{}, 1]
+    raw_cursor(["i", "1"]),
+    raw_cursor([1, 1]),
+    raw_cursor(["i", True]),
+    raw_cursor(["i", None]),
+    raw_cursor(["i"]),
+    raw_cursor({"rank": "i"}),
+    "не base64",
+])
+def test_tampered_cursor(client, column_tasks, cursor):
+    column_id, _, headers = column_tasks
+    response = client.get(f"/columns/{column_id}/tasks/?limit=2&cursor={cursor}", headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("values", [[5, 1], [["2026-01-01"], 1], ["вчера", 1]])
+def test_tampered_datetime_cursor(client, column_tasks, values):
+    _, task_ids, headers = column_tasks
+    response = client.get(f"/tasks/{task_ids[0]}/logs/?limit=1&cursor={raw_cursor(values)}", headers=headers)
+    assert response.status_code == 400
+
+
+def test_datetime_cursor(client, column_tasks):
+    _, task_ids, headers = column_tasks
+    cursor = encode_cursor(["2000-01-01T00:00:00", 0])
+    assert client.get(f"/tasks/{task_ids[0]}/logs/?cursor={cursor}", headers=headers).status_code == 200
@@ -0,0 +1,96 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.auth import principal_cache
+from app.database import get_async_engine, get_engine
+from app.snapshots import snapshot_cache
+
+
+@contextmanager
+def count_queries():
+    """SELECT-запросы, выполненные внутри блока.
+
+    Записи аудита пишет фоновый поток, и его INSERT могут попасть в блок.
+    """
+    statements = []
+    lock = threading.Lock()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            with lock:
+                statements.append(statement)
+
+    engines = [get_engine(), get_async_engine().sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", count)
+
+
+def fill_board(client, project_id: int, headers: dict, columns: int, tasks: int):
+    for i in range(columns):
+        column = client.post(f"/projects/{project_id}/columns/", json={"name": f"Колонка {i}", "order": i}, headers=headers)
+        for j in range(tasks):
+            client.post(f"/columns/{column.json()['id']}/tasks/", json={"title": f"Задача {j}"}, headers=headers)
+
+
+def board_queries(client, project_id: int, headers: dict) -> int:
+    url = f"/projects/{project_id}/board"
+    assert client.get(url, headers=headers).status_code == 200  # Кэши токена и ролей
+    with count_queries() as statements:
+        assert client.get(url, headers=headers).status_code == 200
+    return len(statements)
+
+
+def user_projects_queries(client, headers: dict) -> int:
+    assert client.get("/projects/me/", headers=headers).status_code == 200
+    snapshot_cache.clear()  # Иначе ответ отдается из кэша без построения
+    with count_queries() as statements:
+        assert client.get("/projects/me/", headers=headers).status_code == 200
+    return len(statements)
+
+
+def test_board_query_count(client, login):
+    _, headers = login()
+    small = client.post("/projects/", json={"name": "Маленькая"}, headers=headers).json()["id"]
+    large = client.post("/projects/", json={"name": "Большая"}, headers=headers).json()["id"]
+    fill_board(client, small, headers, columns=1, tasks=1)
+    fill_board(client, large, headers, columns=12, tasks=5)
+    # Проект, колонки, задачи - независимо от размера доски
+    assert board_queries(client, small, headers) == 3
+    assert board_queries(client, large, headers) == 3
+
+
+def test_user_projects_query_count(client, login):
+    member_id, member_headers = login()
+    _, headers = login()
+    for i in range(5):
+        project_id = client.post("/projects/", json={"name": f"Проект {i}"}, headers=headers).json()["id"]
+        client.post(f"/projects/{project_id}/add-member/?user_id={member_id}", headers=headers)
+        fill_board(client, project_id, headers, columns=2, tasks=2)
+    # Версия, проекты, участники, число задач
+    assert user_projects_queries(client, headers) == 4
+    assert user_projects_queries(client, member_headers) == 4
+
+
+def test_async_reads_hold_one_connection(client, project):
+    """Без реплики чтение идет в сессии get_current_user, а не во второй из того же пула."""
+    project_id, headers = project
+    column_id = client.post(f"/projects/{project_id}/columns/", json={"name": "Колонка"}, headers=headers).json()["id"]
+    pool = get_async_engine().sync_engine.pool
+    for url in ("/projects/me/", f"/columns/{column_id}/tasks/"):
+        principal_cache.clear()  # Промах кэша: get_current_user читает пользователя в своей сессии
+        snapshot_cache.clear()
+        checkouts = []
+        listener = lambda *args: checkouts.append(url)
+        event.listen(pool, "checkout", listener)
+        try:
+            assert client.get(url, headers=headers).status_code == 200
+        finally:
+            event.remove(pool, "checkout", listener)
+        assert len(checkouts) == 1
@@ -0,0 +1,116 @@
+import pytest
+
+from app.database import new_session
+from app.models import Task
+from app.ranking import REBALANCE_RANK_LENGTH, evenly_spaced_ranks, rank_after, rank_between
+
+# tasks.rank - String(64)
+RANK_COLUMN_LENGTH = 64
+
+
+def test_rank_after_keeps_order_and_length():
+    ranks = [rank_after(None)]
+    for _ in range(9999):
+        ranks.append(rank_after(ranks[-1]))
+    assert ranks == sorted(ranks)
+    assert len(set(ranks)) == len(ranks)
+    assert not any(rank.endswith("0") for rank in ranks)
+    assert max(map(len, ranks)) <= 8
+
+
+def test_rank_after_carries():
+    assert rank_after("abz") == "ac1"
+    assert rank_after("zz") == "zz01"
+    assert rank_between(rank_after("z"), "z2") > "z1"
+
+
+def test_evenly_spaced_ranks_are_ordered():
+    ranks = evenly_spaced_ranks(1000)
+    assert ranks == sorted(ranks) and len(set(ranks)) == 1000
+
+
+def column_ranks(column_id: int) -> list[str]:
+    db = new_session()
+    try:
+        return [rank for rank, in db.query(Task.rank).filter(Task.column_id == column_id).order_by(Task.id)]
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def column(client, project):
+    project_id, headers = project
+    column = client.post(f"/projects/{project_id}/columns/", json={"name": "Бэклог", "order": 0}, headers=headers)
+    return column.json()["id"], headers
+
+
+def test_append_1000_tasks(client, column):
+    column_id, headers = column
+    url = f"/columns/{column_id}/tasks/"
+    for i in range(500):
+        assert client.post(url, json={"title": f"Задача {i}"}, headers=headers).status_code == 200
+    operations = [{"op": "create_task", "column_id": column_id, "task": {"title": f"Пакет {i}"}} for i in range(500)]
+    assert client.post("/batch", json={"operations": operations}, headers=headers).status_code == 200
+    ranks = column_ranks(column_id)
+    assert len(ranks) == 1000
+    assert ranks == sorted(ranks)
+    assert max(map(len, ranks)) <= RANK_COLUMN_LENGTH
+
+
+@pytest.mark.parametrize("batch", [False, True])
+def test_long_ranks_are_rebalanced_on_create(client, column, batch):
+    column_id, headers = column
+    url = f"/columns/{column_id}/tasks/"
+    task_id = client.post(url, json={"title": "Старая"}, headers=headers).json()["id"]
+    db = new_session()
+    try:
+        db.query(Task).filter(Task.id == task_id).update({Task.rank: "i" * (REBALANCE_RANK_LENGTH + 1)})
+        db.commit()
+    finally:
+        db.close()
+    if batch:
+        operations = [{"op": "create_task", "column_id": column_id, "task": {"title": "Новая"}}]
+        client.post("/batch", json={"operations": operations}, headers=headers)
+    else:
+        client.post(url, json={"title": "Новая"}, headers=headers)
+    ranks = column_ranks(column_id)
+    assert ranks == sorted(ranks)
+    assert max(map(len, ranks)) <= REBALANCE_RANK_LENGTH
+
+
+def create_tasks(client, column_id: int, headers: dict, count: int) -> list[int]:
+    url = f"/columns/{column_id}/tasks/"
+    return [client.post(url, json={"title": f"Задача {i}"}, headers=headers).json()["id"] for i in range(count)]
+
+
+@pytest.mark.parametrize("pair", ["inverted", "same"])
+def test_move_between_misordered_neighbours(client, column, pair):
+    column_id, headers = column
+    first, second, moved = create_tasks(client, column_id, headers, 3)
+    after, before = (second, first) if pair == "inverted" else (first, first)
+    ranks = column_ranks(column_id)
+    response = client.post(
+        f"/tasks/{moved}/move", json={"column_id": column_id, "after_task_id": after, "before_task_id": before},
+        headers=headers
+    )
+    assert response.status_code == 400
+    # Колонка не перенумерована
+    assert column_ranks(column_id) == ranks
+
+
+def test_move_between_duplicate_ranks(client, column):
+    column_id, headers = column
+    first, second, moved = create_tasks(client, column_id, headers, 3)
+    db = new_session()
+    try:
+        db.query(Task).filter(Task.id.in_([first, second])).update({Task.rank: "i"})
+        db.commit()
+    finally:
+        db.close()
+    response = client.post(
+        f"/tasks/{moved}/move", json={"column_id": column_id, "after_task_id": first, "before_task_id": second},
+        headers=headers
+    )
+    assert response.status_code == 200
+    order = [t["id"] for t in client.get(f"/columns/{column_id}/tasks/", headers=headers).json()]
+    assert order == [first, moved, second]
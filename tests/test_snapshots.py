@@ -0,0 +1,74 @@
+import pytest
+
+
+@pytest.fixture
+def board(client, project):
+    project_id, headers = project
+    columns = [
+        client.post(f"/projects/{project_id}/columns/", json={"name": f"Колонка {i}", "order": i}, headers=headers).json()["id"]
+        for i in range(2)
+    ]
+    task_id = client.post(f"/columns/{columns[0]}/tasks/", json={"title": "Задача"}, headers=headers).json()["id"]
+    return project_id, columns, task_id, headers
+
+
+def etag(client, url: str, headers: dict) -> str:
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def assert_not_modified(client, url: str, headers: dict, tag: str):
+    response = client.get(url, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == tag
+    assert response.content == b""
+
+
+def assert_modified(client, url: str, headers: dict, tag: str) -> str:
+    response = client.get(url, headers={**headers, "If-None-Match": tag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != tag
+    return response.headers["ETag"]
+
+
+def test_repeated_get_is_not_modified(client, board):
+    _, columns, task_id, headers = board
+    for url in (f"/columns/{columns[0]}/tasks/", f"/tasks/{task_id}", "/projects/me/"):
+        assert_not_modified(client, url, headers, etag(client, url, headers))
+
+
+def test_task_move_changes_etag(client, board):
+    _, columns, task_id, headers = board
+    urls = [f"/columns/{column_id}/tasks/" for column_id in columns] + [f"/tasks/{task_id}"]
+    tags = [etag(client, url, headers) for url in urls]
+    client.post(f"/tasks/{task_id}/move", json={"column_id": columns[1]}, headers=headers)
+    for url, tag in zip(urls, tags):
+        assert_modified(client, url, headers, tag)
+    assert [t["id"] for t in client.get(urls[1], headers=headers).json()] == [task_id]
+
+
+def test_column_change_changes_etag(client, board):
+    _, columns, _, headers = board
+    url = f"/columns/{columns[0]}/tasks/"
+    tag = etag(client, url, headers)
+    client.put(f"/columns/{columns[1]}", json={"name": "Переименована", "order": 1}, headers=headers)
+    tag = assert_modified(client, url, headers, tag)
+    assert_not_modified(client, url, headers, tag)
+
+
+def test_membership_change_changes_etag(client, login, board):
+    project_id, _, _, headers = board
+    member_id, member_headers = login()
+    owner_tag = etag(client, "/projects/me/", headers)
+    member_tag = etag(client, "/projects/me/", member_headers)
+
+    client.post(f"/projects/{project_id}/add-member/?user_id={member_id}", headers=headers)
+    owner_tag = assert_modified(client, "/projects/me/", headers, owner_tag)
+    member_tag = assert_modified(client, "/projects/me/", member_headers, member_tag)
+    assert [p["id"] for p in client.get("/projects/me/", headers=member_headers).json()] == [project_id]
+
+    client.delete(f"/projects/{project_id}/remove-member/{member_id}", headers=headers)
+    assert_modified(client, "/projects/me/", headers, owner_tag)
+    assert_modified(client, "/projects/me/", member_headers, member_tag)
+    assert client.get("/projects/me/", headers=member_headers).json() == []
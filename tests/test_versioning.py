@@ -0,0 +1,77 @@
+import pytest
+
+from app.crud import VERSION_CONFLICT_DETAIL
+
+
+@pytest.fixture
+def column(client, project):
+    project_id, headers = project
+    column = client.post(f"/projects/{project_id}/columns/", json={"name": "Сделать", "order": 0}, headers=headers).json()
+    return column, headers
+
+
+@pytest.fixture
+def task(client, column):
+    column, headers = column
+    task = client.post(f"/columns/{column['id']}/tasks/", json={"title": "Задача"}, headers=headers).json()
+    return task, headers
+
+
+def test_task_update_with_current_version(client, task):
+    task, headers = task
+    assert task["version"] == 1
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Новая", "version": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert client.get(f"/tasks/{task['id']}", headers=headers).json()["title"] == "Новая"
+
+
+def test_task_update_with_stale_version(client, task):
+    task, headers = task
+    client.put(f"/tasks/{task['id']}", json={"title": "Первая правка", "version": 1}, headers=headers)
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Вторая правка", "version": 1}, headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == VERSION_CONFLICT_DETAIL
+    stored = client.get(f"/tasks/{task['id']}", headers=headers).json()
+    assert (stored["title"], stored["version"]) == ("Первая правка", 2)
+
+
+def test_task_update_without_version(client, task):
+    task, headers = task
+    for version in (2, 3):
+        response = client.put(f"/tasks/{task['id']}", json={"title": f"Правка {version}"}, headers=headers)
+        assert response.json()["version"] == version
+
+
+def test_task_update_by_other_member(client, login, project, task):
+    project_id, owner_headers = project
+    task, _ = task
+    member_id, member_headers = login()
+    client.post(f"/projects/{project_id}/add-member/?user_id={member_id}", headers=owner_headers)
+    response = client.put(f"/tasks/{task['id']}", json={"title": "Чужая", "version": 1}, headers=member_headers)
+    assert response.status_code == 403
+    assert client.get(f"/tasks/{task['id']}", headers=owner_headers).json()["version"] == 1
+
+
+def test_batch_update_with_stale_version(client, task):
+    task, headers = task
+    client.put(f"/tasks/{task['id']}", json={"title": "Первая правка"}, headers=headers)
+    operations = [{"op": "update_task", "task_id": task["id"], "task": {"title": "Пакет"}, "version": 1}]
+    response = client.post("/batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == {"index": 0, "detail": VERSION_CONFLICT_DETAIL}
+    assert client.get(f"/tasks/{task['id']}", headers=headers).json()["title"] == "Первая правка"
+
+
+def test_column_update_versions(client, project, column):
+    project_id, _ = project
+    column, headers = column
+    url = f"/columns/{column['id']}"
+    response = client.put(url, json={"name": "В работе", "order": 1, "version": 1}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    stale = client.put(url, json={"name": "Готово", "order": 2, "version": 1}, headers=headers)
+    assert stale.status_code == 409
+    board = client.get(f"/projects/{project_id}/board", headers=headers).json()
+    stored = next(c for c in board["columns"] if c["id"] == column["id"])
+    assert (stored["name"], stored["order"], stored["version"]) == ("В работе", 1, 2)